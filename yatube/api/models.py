@@ -0,0 +1,27 @@
+from django.db import models
+
+from core.models import CreatedModel
+from posts.models import User
+
+
+class Token(CreatedModel):
+    """Ключ доступа к API для клиентов без сессии и CSRF-cookie.
+
+    Клиент передаёт ключ заголовком `Authorization: Token <ключ>`. В базе
+    хранится только SHA-256 ключа, сам ключ показывается один раз при
+    выпуске.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='api_token',
+        verbose_name='Пользователь',
+    )
+    digest = models.CharField('SHA-256 ключа', max_length=64, unique=True)
+
+    class Meta:
+        verbose_name = 'Токен API'
+        verbose_name_plural = 'Токены API'
+
+    def __str__(self):
+        return f'Токен {self.user}'
@@ -0,0 +1,72 @@
+"""Представление моделей в JSON.
+
+Каждое поле — функция от объекта, поэтому клиент может запросить
+только нужные поля параметром `?fields=id,text,author`.
+"""
+
+
+def _datetime(value):
+    return value.isoformat() if value else None
+
+
+def _file_url(field):
+    return field.url if field else None
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: _datetime(post.pub_date),
+    'author': lambda post: post.author.username,
+    # Разметку `is_following` делает view (`posts.follows`).
+    'author_following': lambda post: post.is_following,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: _file_url(post.image),
+    'thumbnail': lambda post: _file_url(post.thumbnail),
+    'comments_count': lambda post: post.comments_count,
+}
+
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: _datetime(comment.created),
+}
+
+GROUP_FIELDS = {
+    'title': lambda group: group.title,
+    'slug': lambda group: group.slug,
+    'description': lambda group: group.description,
+}
+
+
+def parse_fields(value, spec):
+    """Список полей из `?fields=`; ValueError для неизвестных."""
+    if not value:
+        return list(spec)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in spec]
+    if unknown:
+        raise ValueError(
+            f'Неизвестные поля: {", ".join(unknown)}; '
+            f'доступны: {", ".join(spec)}'
+        )
+    return fields
+
+
+def serialize(obj, spec, fields=None):
+    return {name: spec[name](obj) for name in fields or spec}
+
+
+def profile(author, counters, following=None):
+    data = {
+        'username': author.username,
+        'full_name': author.get_full_name(),
+        'posts_count': counters.posts_count,
+        'followers_count': counters.followers_count,
+        'following_count': counters.following_count,
+    }
+    if following is not None:
+        data['following'] = following
+    return data
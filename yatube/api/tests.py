@@ -0,0 +1,405 @@
+import json
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import follows, tasks
+from posts.models import (
+    Comment, Follow, FollowSuggestion, Group, Post, User, UserCounter,
+)
+from taskqueue.models import Task
+
+
+@override_settings(TASKS_EAGER=True)
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='api_author')
+        cls.reader = User.objects.create_user(username='api_reader')
+        cls.group = Group.objects.create(
+            title='API', slug='api', description='Группа')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {index}')
+            for index in range(15)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_feed_cursor_pagination_and_fields(self):
+        """Лента режется курсором, `fields` оставляет нужные поля."""
+        url = reverse('api:posts')
+        data = self.guest.get(url, {'fields': 'id,author'}).json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(
+            data['results'][0], {'id': self.posts[-1].pk,
+                                 'author': 'api_author'})
+        self.assertIsNone(data['previous'])
+        second = self.guest.get(data['next']).json()
+        self.assertEqual(
+            [post['id'] for post in second['results']],
+            [post.pk for post in reversed(self.posts[:5])]
+        )
+        self.assertIsNone(second['next'])
+
+    def test_unknown_field_is_rejected(self):
+        response = self.guest.get(reverse('api:posts'), {'fields': 'secret'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_mirrored_read_endpoints(self):
+        endpoints = {
+            reverse('api:group_posts', args=['api']): 10,
+            reverse('api:profile_posts', args=['api_author']): 10,
+            reverse('api:comments', args=[self.posts[0].pk]): 0,
+        }
+        for url, count in endpoints.items():
+            with self.subTest(url=url):
+                data = self.guest.get(url).json()
+                self.assertEqual(len(data['results']), count)
+        profile = self.client.get(
+            reverse('api:profile', args=['api_author'])).json()
+        self.assertEqual(profile['posts_count'], 15)
+        self.assertFalse(profile['following'])
+        post = self.guest.get(
+            reverse('api:post_detail', args=[self.posts[0].pk])).json()
+        self.assertEqual(post['group'], 'api')
+        self.assertEqual(
+            self.guest.get(reverse('api:post_detail', args=[0])).status_code,
+            HTTPStatus.NOT_FOUND
+        )
+
+    def test_not_modified_without_queries(self):
+        """Неизменённая лента отвечает 304 без запросов к базе."""
+        url = reverse('api:posts')
+        response = self.guest.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(0):
+            response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+        Post.objects.create(author=self.author, text='Новый')
+        response = self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_new_comment_changes_post_etag(self):
+        url = reverse('api:post_detail', args=[self.posts[0].pk])
+        etag = self.guest.get(url)['ETag']
+        self.assertEqual(
+            self.guest.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            HTTPStatus.NOT_MODIFIED
+        )
+        response = self.client.post(
+            reverse('api:comments', args=[self.posts[0].pk]),
+            json.dumps({'text': 'Из приложения'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(response.json()['author'], 'api_reader')
+        self.assertTrue(Comment.objects.filter(text='Из приложения').exists())
+        self.assertEqual(
+            self.guest.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            HTTPStatus.OK
+        )
+
+    def test_posts_marked_with_author_following(self):
+        """Посты размечены подпиской на автора, и подписка меняет ETag."""
+        urls = [
+            reverse('api:posts'),
+            reverse('api:group_posts', args=['api']),
+            reverse('api:profile_posts', args=['api_author']),
+            reverse('api:post_detail', args=[self.posts[0].pk]),
+        ]
+        etags = {}
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, {'fields': 'author_following'})
+                data = response.json()
+                self.assertFalse(data.get('results', [data])[0][
+                    'author_following'])
+                etags[url] = response['ETag']
+        self.assertFalse(self.guest.get(urls[-1]).json()['author_following'])
+
+        self.client.post(reverse('api:follow', args=['api_author']))
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, {'fields': 'author_following'},
+                    HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                data = response.json()
+                self.assertTrue(data.get('results', [data])[0][
+                    'author_following'])
+
+    def test_writes_require_login(self):
+        responses = (
+            self.guest.post(
+                reverse('api:comments', args=[self.posts[0].pk]),
+                {'text': 'Аноним'}),
+            self.guest.post(reverse('api:follow', args=['api_author'])),
+            self.guest.get(reverse('api:follow_feed')),
+        )
+        for response in responses:
+            self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_follow_unfollow_and_feed(self):
+        url = reverse('api:follow', args=['api_author'])
+        self.assertEqual(
+            self.client.post(url).status_code, HTTPStatus.CREATED)
+        self.assertEqual(self.client.post(url).status_code, HTTPStatus.OK)
+        feed = self.client.get(reverse('api:follow_feed')).json()
+        self.assertEqual(feed['results'][0]['id'], self.posts[-1].pk)
+
+        self.assertEqual(
+            self.client.delete(url).status_code, HTTPStatus.NO_CONTENT)
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+        feed = self.client.get(reverse('api:follow_feed')).json()
+        self.assertEqual(feed['results'], [])
+
+    def test_cannot_follow_self(self):
+        response = self.client.post(reverse('api:follow', args=['api_reader']))
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class FollowBulkApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = {
+            name: User.objects.create_user(username=name)
+            for name in ('anna', 'boris', 'vera', 'gleb')
+        }
+        Post.objects.create(author=cls.authors['anna'], text='Пост Анны')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def bulk(self, **data):
+        return self.client.post(
+            reverse('api:follow_bulk'),
+            json.dumps(data),
+            content_type='application/json',
+        )
+
+    def test_bulk_follow_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk(
+                follow=['anna', 'boris', 'nobody', 'reader', 'anna'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json(), {
+            'followed': ['anna', 'boris'],
+            'unfollowed': [],
+            'not_found': ['nobody'],
+        })
+        inserts = [
+            query for query in queries
+            if query['sql'].startswith('INSERT')
+            and 'INTO "posts_follow"' in query['sql']
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(
+            UserCounter.objects.get(user=self.reader).following_count, 2)
+        self.assertEqual(
+            UserCounter.objects.get(
+                user=self.authors['boris']).followers_count, 1)
+        feed = self.client.get(reverse('api:follow_feed')).json()
+        self.assertEqual(len(feed['results']), 1)
+
+        self.assertEqual(self.bulk(follow=['anna']).json()['followed'], [])
+
+    def test_bulk_follow_counts_concurrent_follow_once(self):
+        """Подписка из параллельного запроса между чтением и INSERT не
+        учитывается в счётчиках дважды."""
+        anna = self.authors['anna']
+        bulk_create = Follow.objects.bulk_create
+
+        def concurrent(objs, **kwargs):
+            follows.follow(self.reader, anna)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(
+                Follow.objects, 'bulk_create', side_effect=concurrent):
+            self.bulk(follow=['anna', 'boris'])
+        self.assertEqual(
+            UserCounter.objects.get(user=anna).followers_count, 1)
+        self.assertEqual(
+            UserCounter.objects.get(user=self.reader).following_count, 2)
+
+    def test_bulk_unfollow(self):
+        self.bulk(follow=['anna', 'boris'])
+        response = self.bulk(unfollow=['anna', 'vera'])
+        self.assertEqual(response.json()['unfollowed'], ['anna'])
+        self.assertEqual(
+            list(Follow.objects.filter(user=self.reader).values_list(
+                'author__username', flat=True)),
+            ['boris'],
+        )
+        self.assertEqual(
+            UserCounter.objects.get(user=self.reader).following_count, 1)
+
+    @override_settings(API_BULK_FOLLOW_LIMIT=2)
+    def test_bulk_rejects_bad_requests(self):
+        self.assertEqual(
+            self.bulk(follow=['anna', 'boris', 'vera']).status_code,
+            HTTPStatus.BAD_REQUEST)
+        self.assertEqual(
+            self.bulk(follow='anna').status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(
+            Client().post(reverse('api:follow_bulk')).status_code,
+            HTTPStatus.UNAUTHORIZED)
+        self.assertFalse(Follow.objects.exists())
+
+    def test_suggestions_are_friends_of_friends(self):
+        anna, boris, vera, gleb = self.authors.values()
+        Follow.objects.create(user=self.reader, author=anna)
+        Follow.objects.create(user=self.reader, author=boris)
+        Follow.objects.create(user=anna, author=vera)
+        Follow.objects.create(user=anna, author=gleb)
+        Follow.objects.create(user=boris, author=vera)
+        Follow.objects.create(user=boris, author=self.reader)
+        out = StringIO()
+        call_command('refresh_suggestions', stdout=out)
+        self.assertTrue(
+            Task.objects.filter(name='posts.tasks.refresh_suggestions')
+            .exists())
+
+        url = reverse('api:suggestions')
+        results = self.client.get(url).json()['results']
+        self.assertEqual(
+            [(item['username'], item['mutual']) for item in results],
+            [('vera', 2), ('gleb', 1)],
+        )
+        self.bulk(follow=['vera'])
+        results = self.client.get(url).json()['results']
+        self.assertEqual([item['username'] for item in results], ['gleb'])
+
+    def test_refresh_drops_suggestions_of_users_without_follows(self):
+        FollowSuggestion.objects.create(
+            user=self.reader, author=self.authors['anna'], score=1)
+        call_command('refresh_suggestions', stdout=StringIO())
+        self.assertFalse(FollowSuggestion.objects.exists())
+
+    def test_failed_refresh_still_schedules_next_run(self):
+        with mock.patch(
+                'posts.suggestions.refresh', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                tasks.refresh_suggestions()
+        self.assertTrue(
+            Task.objects.filter(name='posts.tasks.refresh_suggestions')
+            .exists())
+
+
+class ApiTokenTests(TestCase):
+    """Клиент с проверкой CSRF, как у настоящего приложения."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='token_reader', password='secret-pass')
+        cls.author = User.objects.create_user(username='token_author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(enforce_csrf_checks=True)
+
+    def issue(self):
+        response = self.client.post(
+            reverse('api:token'),
+            json.dumps({'username': 'token_reader',
+                        'password': 'secret-pass'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        return {'HTTP_AUTHORIZATION': f'Token {response.json()["token"]}'}
+
+    def writes(self):
+        """(метод, url, тело, код успеха) для каждой записи API."""
+        return [
+            ('post', reverse('api:comments', args=[self.post.pk]),
+             {'text': 'Из приложения'}, HTTPStatus.CREATED),
+            ('post', reverse('api:follow', args=['token_author']),
+             None, HTTPStatus.CREATED),
+            ('delete', reverse('api:follow', args=['token_author']),
+             None, HTTPStatus.NO_CONTENT),
+            ('post', reverse('api:follow_bulk'),
+             {'follow': ['token_author']}, HTTPStatus.OK),
+        ]
+
+    def send(self, method, url, data, **headers):
+        return getattr(self.client, method)(
+            url,
+            json.dumps(data or {}),
+            content_type='application/json',
+            **headers,
+        )
+
+    def test_token_writes_pass_csrf_checks(self):
+        headers = self.issue()
+        for method, url, data, status in self.writes():
+            with self.subTest(method=method, url=url):
+                response = self.send(method, url, data, **headers)
+                self.assertEqual(response.status_code, status)
+        self.assertTrue(Comment.objects.filter(
+            author=self.reader, text='Из приложения').exists())
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists())
+        feed = self.client.get(reverse('api:follow_feed'), **headers)
+        self.assertEqual(feed.json()['results'][0]['id'], self.post.pk)
+        self.assertIn('Authorization', feed['Vary'])
+
+    def test_session_writes_without_csrf_get_json_403(self):
+        self.client.force_login(self.reader)
+        for method, url, data, _ in self.writes():
+            with self.subTest(method=method, url=url):
+                response = self.send(method, url, data)
+                self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+                self.assertIn('CSRF', response.json()['detail'])
+        self.assertFalse(Follow.objects.exists())
+
+    def test_anonymous_and_bad_token_get_json_401(self):
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Token wrong'}):
+            for method, url, data, _ in self.writes():
+                with self.subTest(headers=headers, url=url):
+                    response = self.send(method, url, data, **headers)
+                    self.assertEqual(
+                        response.status_code, HTTPStatus.UNAUTHORIZED)
+                    self.assertEqual(response['WWW-Authenticate'], 'Token')
+                    self.assertIn('detail', response.json())
+
+    def test_token_reissue_and_revoke(self):
+        old = self.issue()
+        new = self.issue()
+        url = reverse('api:follow_feed')
+        self.assertEqual(
+            self.client.get(url, **old).status_code, HTTPStatus.UNAUTHORIZED)
+        self.assertEqual(self.client.get(url, **new).status_code,
+                         HTTPStatus.OK)
+        self.assertEqual(
+            self.client.delete(reverse('api:token'), **new).status_code,
+            HTTPStatus.NO_CONTENT)
+        self.assertEqual(
+            self.client.get(url, **new).status_code, HTTPStatus.UNAUTHORIZED)
+        response = self.client.post(
+            reverse('api:token'),
+            json.dumps({'username': 'token_reader', 'password': 'wrong'}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
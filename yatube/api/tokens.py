@@ -0,0 +1,29 @@
+"""Выпуск и проверка токенов API (`api.models.Token`)."""
+import hashlib
+import secrets
+
+from .models import Token
+
+
+def digest(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def issue(user):
+    """Выпускает пользователю новый ключ взамен прежнего и возвращает его.
+    """
+    key = secrets.token_hex(20)
+    Token.objects.update_or_create(
+        user=user, defaults={'digest': digest(key)})
+    return key
+
+
+def revoke(user):
+    Token.objects.filter(user=user).delete()
+
+
+def authenticate(key):
+    """Активный пользователь ключа или None."""
+    token = Token.objects.select_related('user').filter(
+        digest=digest(key), user__is_active=True).first()
+    return token and token.user
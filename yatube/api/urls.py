@@ -0,0 +1,63 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path(
+        'token/',
+        views.token,
+        name='token'
+    ),
+    path(
+        'posts/',
+        views.posts,
+        name='posts'
+    ),
+    path(
+        'posts/<int:post_id>/',
+        views.post_detail,
+        name='post_detail'
+    ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.comments,
+        name='comments'
+    ),
+    path(
+        'groups/<slug:slug>/posts/',
+        views.group_posts,
+        name='group_posts'
+    ),
+    path(
+        'profiles/<str:username>/',
+        views.profile,
+        name='profile'
+    ),
+    path(
+        'profiles/<str:username>/posts/',
+        views.profile_posts,
+        name='profile_posts'
+    ),
+    path(
+        'profiles/<str:username>/follow/',
+        views.follow,
+        name='follow'
+    ),
+    path(
+        'follow/',
+        views.follow_feed,
+        name='follow_feed'
+    ),
+    path(
+        'follow/bulk/',
+        views.follow_bulk,
+        name='follow_bulk'
+    ),
+    path(
+        'suggestions/',
+        views.follow_suggestions,
+        name='suggestions'
+    ),
+]
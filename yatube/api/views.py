@@ -0,0 +1,405 @@
+"""JSON API лент, постов, комментариев и подписок.
+
+Повторяет HTML-view приложения posts: ленты отдаются keyset-страницами
+(`?cursor=`, `?limit=`), поля выбираются параметром `?fields=`, а GET
+отвечает 304 по `ETag`/`Last-Modified`, не обращаясь к базе за постами.
+Клиенты аутентифицируются токеном из `token/` (заголовок
+`Authorization: Token <ключ>`); сессия сайта тоже принимается, но
+меняющие данные запросы с ней требуют CSRF-токена.
+"""
+import json
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib import auth
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from core.utils import CursorPaginator
+from posts.caching import (
+    comment_scopes, conditional, feed_author, feed_group, group_feed_scopes,
+    profile_scopes,
+)
+from posts import follows, suggestions
+from posts.counters import get_counters
+from posts.forms import CommentForm
+from posts.models import Comment, Post, User
+from posts.timeline import timeline_posts
+from . import serializers, tokens
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+TOKEN_SCHEME = 'Token'
+
+
+def error(message, status=HTTPStatus.BAD_REQUEST):
+    return JsonResponse({'detail': message}, status=status)
+
+
+def unauthorized(message):
+    response = error(message, HTTPStatus.UNAUTHORIZED)
+    response['WWW-Authenticate'] = TOKEN_SCHEME
+    return response
+
+
+def login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return unauthorized('Требуется вход.')
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def api_view(view):
+    """Аутентификация API: токен или сессия сайта.
+
+    С заголовком `Authorization: Token <ключ>` пользователь берётся из
+    токена, и CSRF-проверка не нужна: браузер не подставляет этот
+    заголовок сам. Запросы с сессией, меняющие данные, проверяются на
+    CSRF, как формы сайта, но отказ приходит в JSON, а не HTML-страницей.
+    """
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        scheme, _, key = request.META.get(
+            'HTTP_AUTHORIZATION', '').partition(' ')
+        if scheme == TOKEN_SCHEME:
+            user = tokens.authenticate(key.strip())
+            if user is None:
+                return unauthorized('Неверный токен.')
+            request.user = user
+        elif (request.method not in SAFE_METHODS
+              and request.user.is_authenticated
+              and CsrfViewMiddleware().process_view(
+                  request, None, (), {}) is not None):
+            return error(
+                'CSRF-проверка не пройдена: используйте токен API.',
+                HTTPStatus.FORBIDDEN,
+            )
+        response = view(request, *args, **kwargs)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+    return wrapper
+
+
+def request_data(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+def page_link(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def paginated(request, queryset, spec, field='pub_date', descending=True,
+              mark_following=False, **extra):
+    """Страница ленты в JSON: `results`, `next`, `previous`.
+
+    С `mark_following=True` посты страницы размечаются подпиской на их
+    авторов по кешированному множеству, без запроса на каждый пост.
+    """
+    try:
+        fields = serializers.parse_fields(request.GET.get('fields'), spec)
+        limit = int(request.GET.get('limit', settings.NUM_OF_POST))
+    except ValueError as exception:
+        return error(str(exception))
+    limit = min(max(limit, 1), settings.API_MAX_PAGE_SIZE)
+    page = CursorPaginator(
+        queryset, limit, field=field, descending=descending,
+    ).get_page(request.GET.get('cursor'))
+    if mark_following:
+        follows.mark_following(request.user, page)
+    return JsonResponse({
+        **extra,
+        'results': [
+            serializers.serialize(obj, spec, fields) for obj in page],
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    })
+
+
+def with_following(request, scopes):
+    """Добавляет к областям подписки пользователя: от них зависит поле
+    `author_following` постов."""
+    if scopes is None or not request.user.is_authenticated:
+        return scopes
+    return [*scopes, f'following:{request.user.pk}']
+
+
+def posts_scopes(request):
+    return with_following(request, ['index'])
+
+
+def group_posts_scopes(request, slug):
+    return with_following(request, group_feed_scopes(request, slug))
+
+
+def profile_posts_scopes(request, username):
+    author = feed_author(request, username)
+    return with_following(request, author and [f'profile:{author.pk}'])
+
+
+def post_scopes(request, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    return with_following(
+        request,
+        author_id and [f'profile:{author_id}', *comment_scopes(post_id)],
+    )
+
+
+def follow_scopes(request):
+    return ['index', f'following:{request.user.pk}']
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD'])
+@conditional(posts_scopes)
+def posts(request):
+    return paginated(
+        request,
+        Post.objects.select_related('author', 'group'),
+        serializers.POST_FIELDS,
+        mark_following=True,
+    )
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD'])
+@conditional(group_posts_scopes)
+def group_posts(request, slug):
+    group = feed_group(request, slug)
+    if group is None:
+        raise Http404
+    return paginated(
+        request,
+        group.posts.select_related('author', 'group'),
+        serializers.POST_FIELDS,
+        mark_following=True,
+        group=serializers.serialize(group, serializers.GROUP_FIELDS),
+    )
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD'])
+@conditional(profile_scopes)
+def profile(request, username):
+    author = feed_author(request, username)
+    if author is None:
+        raise Http404
+    following = None
+    if request.user.is_authenticated:
+        following = follows.is_following(request.user, author)
+    return JsonResponse(serializers.profile(
+        author, get_counters(author), following))
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD'])
+@conditional(profile_posts_scopes)
+def profile_posts(request, username):
+    author = feed_author(request, username)
+    if author is None:
+        raise Http404
+    return paginated(
+        request,
+        author.posts.select_related('author', 'group'),
+        serializers.POST_FIELDS,
+        mark_following=True,
+    )
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD'])
+@conditional(post_scopes)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        follows.annotate_following(
+            Post.objects.select_related('author', 'group'), request.user),
+        pk=post_id,
+    )
+    try:
+        fields = serializers.parse_fields(
+            request.GET.get('fields'), serializers.POST_FIELDS)
+    except ValueError as exception:
+        return error(str(exception))
+    return JsonResponse(
+        serializers.serialize(post, serializers.POST_FIELDS, fields))
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD', 'POST'])
+@conditional(lambda request, post_id: comment_scopes(post_id))
+def comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    if request.method == 'POST':
+        return add_comment(request, post)
+    return paginated(
+        request,
+        Comment.objects.filter(post=post).select_related('author'),
+        serializers.COMMENT_FIELDS,
+        field='created',
+        descending=False,
+    )
+
+
+@login_required
+def add_comment(request, post):
+    data = request_data(request)
+    if data is None:
+        return error('Тело запроса — не JSON.')
+    form = CommentForm(data)
+    if not form.is_valid():
+        return JsonResponse(
+            {'errors': form.errors}, status=HTTPStatus.BAD_REQUEST)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    comment.save()
+    return JsonResponse(
+        serializers.serialize(comment, serializers.COMMENT_FIELDS),
+        status=HTTPStatus.CREATED,
+    )
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD'])
+@login_required
+@conditional(follow_scopes)
+def follow_feed(request):
+    return paginated(
+        request,
+        timeline_posts(request.user),
+        serializers.POST_FIELDS,
+        field='feed_date',
+        mark_following=True,
+    )
+
+
+@api_view
+@require_http_methods(['POST', 'DELETE'])
+@login_required
+def follow(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.method == 'DELETE':
+        follows.unfollow(request.user, author)
+        return HttpResponse(status=HTTPStatus.NO_CONTENT)
+    if author == request.user:
+        return error('Нельзя подписаться на себя.')
+    created = follows.follow(request.user, author)
+    return JsonResponse(
+        {'username': author.username, 'following': True},
+        status=HTTPStatus.CREATED if created else HTTPStatus.OK,
+    )
+
+
+def usernames(data, key):
+    """Список имён из поля `key` тела запроса; ValueError, если это не
+    список строк."""
+    if hasattr(data, 'getlist'):
+        return data.getlist(key)
+    names = data.get(key, [])
+    if not isinstance(names, list) or not all(
+            isinstance(name, str) for name in names):
+        raise ValueError(f'Поле {key} должно быть списком имён.')
+    return names
+
+
+@api_view
+@require_http_methods(['POST'])
+@login_required
+def follow_bulk(request):
+    """Подписка и отписка списками имён в одной транзакции.
+
+    Тело: `{"follow": [...], "unfollow": [...]}`.
+    """
+    data = request_data(request)
+    if data is None:
+        return error('Тело запроса — не JSON.')
+    try:
+        to_follow = usernames(data, 'follow')
+        to_unfollow = usernames(data, 'unfollow')
+    except ValueError as exception:
+        return error(str(exception))
+    if len(to_follow) + len(to_unfollow) > settings.API_BULK_FOLLOW_LIMIT:
+        return error(
+            f'Не больше {settings.API_BULK_FOLLOW_LIMIT} имён за запрос.')
+    users = {
+        user.username: user
+        for user in User.objects.filter(
+            username__in=[*to_follow, *to_unfollow])
+    }
+    with transaction.atomic():
+        followed = follows.follow_many(
+            request.user,
+            [users[name] for name in to_follow if name in users],
+        )
+        unfollowed = set(follows.unfollow_many(
+            request.user,
+            [users[name] for name in to_unfollow if name in users],
+        ))
+    return JsonResponse({
+        'followed': [author.username for author in followed],
+        'unfollowed': [
+            name for name in to_unfollow
+            if name in users and users[name].pk in unfollowed
+        ],
+        'not_found': [
+            name for name in dict.fromkeys([*to_follow, *to_unfollow])
+            if name not in users
+        ],
+    })
+
+
+@api_view
+@require_http_methods(['GET', 'HEAD'])
+@login_required
+def follow_suggestions(request):
+    """Кого читать: заранее посчитанные друзья друзей."""
+    return JsonResponse({
+        'results': [
+            {
+                'username': suggestion.author.username,
+                'full_name': suggestion.author.get_full_name(),
+                'mutual': suggestion.score,
+            }
+            for suggestion in suggestions.for_user(request.user)
+        ],
+    })
+
+
+@api_view
+@require_http_methods(['POST', 'DELETE'])
+def token(request):
+    """Выпуск токена по имени и паролю (POST) и отзыв (DELETE)."""
+    if request.method == 'DELETE':
+        if not request.user.is_authenticated:
+            return unauthorized('Требуется вход.')
+        tokens.revoke(request.user)
+        return HttpResponse(status=HTTPStatus.NO_CONTENT)
+    data = request_data(request)
+    if data is None:
+        return error('Тело запроса — не JSON.')
+    user = auth.authenticate(
+        request,
+        username=data.get('username'),
+        password=data.get('password'),
+    )
+    if user is None:
+        return unauthorized('Неверное имя пользователя или пароль.')
+    return JsonResponse(
+        {'token': tokens.issue(user)}, status=HTTPStatus.CREATED)
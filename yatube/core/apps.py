@@ -1,5 +1,21 @@
 from django.apps import AppConfig
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import connections
+        from .sqlite import configure
+
+        connection_created.connect(configure, dispatch_uid='core.sqlite')
+        connection_created.connect(
+            connections.opened, dispatch_uid='core.connections.opened')
+        request_started.connect(
+            connections.check, dispatch_uid='core.connections.check')
+        request_finished.connect(
+            connections.enforce_pool_size,
+            dispatch_uid='core.connections.pool_size',
+        )
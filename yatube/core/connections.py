@@ -0,0 +1,71 @@
+"""Постоянные соединения с базой.
+
+Django держит по соединению на поток и алиас и при `CONN_MAX_AGE > 0`
+не закрывает его между запросами. Здесь к этому добавлены:
+
+* проверка перед запросом: соединение, которое база успела закрыть,
+  закрывается и открывается заново, а не роняет первый запрос;
+* предел `DATABASE_POOL_SIZE` на процесс: сверх него соединения потока
+  закрываются по окончании запроса, а не копятся при росте числа потоков;
+* учёт открытых соединений для метрик переиспользования.
+"""
+import threading
+import weakref
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+_lock = threading.Lock()
+_open = weakref.WeakSet()
+
+
+def opened(sender, connection, **kwargs):
+    """Обработчик `connection_created`."""
+    with _lock:
+        _open.add(connection)
+    request_metrics = metrics.current.get()
+    if request_metrics is not None:
+        request_metrics.db_connects += 1
+
+
+def open_count():
+    with _lock:
+        return sum(
+            1 for connection in _open if connection.connection is not None)
+
+
+def usable(connection):
+    """Пробный `SELECT 1` мимо обёрток Django.
+
+    `is_usable()` бэкенда SQLite всегда возвращает True, поэтому
+    соединение проверяется настоящим запросом.
+    """
+    try:
+        connection.connection.cursor().execute('SELECT 1')
+    except connection.Database.Error:
+        return False
+    return True
+
+
+def check(**kwargs):
+    """Обработчик `request_started`: закрывает негодные соединения."""
+    if not settings.DATABASE_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block
+                and not usable(connection)):
+            connection.close()
+
+
+def enforce_pool_size(**kwargs):
+    """Обработчик `request_finished`: закрывает соединения потока,
+    если процесс держит их больше `DATABASE_POOL_SIZE`."""
+    if open_count() <= settings.DATABASE_POOL_SIZE:
+        return
+    for connection in connections.all():
+        if (connection.connection is not None
+                and not connection.in_atomic_block):
+            connection.close()
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core import sqlite
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверяет доступность базы и выводит действующие PRAGMA SQLite '
+        'в сравнении с SQLITE_PRAGMAS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--integrity', action='store_true',
+            help='Выполнить PRAGMA quick_check (читает всю базу).')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.stdout.write(
+            f'{options["database"]}: {connection.vendor}, соединение есть, '
+            f'CONN_MAX_AGE = {connection.settings_dict["CONN_MAX_AGE"]}')
+        if connection.vendor != 'sqlite':
+            return
+
+        wrong = sqlite.mismatches(connection)
+        for name, value in sqlite.pragmas(connection).items():
+            line = f'{name:>16} = {value}'
+            if name in wrong:
+                line += f' (ожидалось {wrong[name][0]})'
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
+        if options['integrity']:
+            result = connection.connection.execute(
+                'PRAGMA quick_check').fetchone()[0]
+            if result != 'ok':
+                raise CommandError(f'quick_check: {result}')
+            self.stdout.write('quick_check = ok')
+        if wrong:
+            raise CommandError(
+                'PRAGMA не совпадают с настройками: ' + ', '.join(wrong))
@@ -0,0 +1,188 @@
+"""Метрики запросов в формате Prometheus.
+
+Счётчики живут в памяти процесса: каждый воркер отдаёт на `/metrics`
+свои значения, а суммирует их Prometheus по метке `instance`.
+"""
+import threading
+from collections import defaultdict
+from contextvars import ContextVar
+from time import perf_counter
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.view = 'unresolved'
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.db_connects = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+
+    @property
+    def duration(self):
+        return perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join((
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.db_queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="hits={self.cache_hits} '
+            f'misses={self.cache_misses}"',
+            f'total;dur={self.duration * 1000:.1f}',
+        ))
+
+
+class Registry:
+    COUNTERS = (
+        ('requests_total', 'Обработано запросов.'),
+        ('db_queries_total', 'Выполнено SQL-запросов.'),
+        ('db_query_seconds_total', 'Время SQL-запросов.'),
+        ('db_requests_total', 'Запросы, обращавшиеся к базе.'),
+        ('db_connections_opened_total', 'Открыто соединений с базой.'),
+        ('cache_hits_total', 'Попадания в кеш.'),
+        ('cache_misses_total', 'Промахи кеша.'),
+        ('template_render_seconds_total', 'Время рендеринга шаблонов.'),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+            self.latency_sum = defaultdict(float)
+            self.counters = defaultdict(lambda: defaultdict(float))
+
+    def observe(self, metrics):
+        duration = metrics.duration
+        view = metrics.view
+        with self.lock:
+            buckets = self.buckets[view]
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    buckets[index] += 1
+            self.latency_sum[view] += duration
+            counters = self.counters[view]
+            counters['requests_total'] += 1
+            counters['db_queries_total'] += metrics.db_queries
+            counters['db_query_seconds_total'] += metrics.db_time
+            counters['db_requests_total'] += bool(metrics.db_queries)
+            counters['db_connections_opened_total'] += metrics.db_connects
+            counters['cache_hits_total'] += metrics.cache_hits
+            counters['cache_misses_total'] += metrics.cache_misses
+            counters['template_render_seconds_total'] += (
+                metrics.template_time)
+
+    def render(self):
+        """Текст в формате Prometheus exposition 0.0.4."""
+        name = 'yatube_request_duration_seconds'
+        lines = [
+            f'# HELP {name} Время обработки запроса.',
+            f'# TYPE {name} histogram',
+        ]
+        with self.lock:
+            for view, buckets in sorted(self.buckets.items()):
+                for bound, value in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(
+                        f'{name}_bucket{{view="{view}",le="{bound}"}} '
+                        f'{value}'
+                    )
+                total = int(self.counters[view]['requests_total'])
+                lines.append(
+                    f'{name}_bucket{{view="{view}",le="+Inf"}} {total}')
+                lines.append(
+                    f'{name}_sum{{view="{view}"}} '
+                    f'{self.latency_sum[view]}'
+                )
+                lines.append(f'{name}_count{{view="{view}"}} {total}')
+            for counter, help_text in self.COUNTERS:
+                name = f'yatube_{counter}'
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for view, counters in sorted(self.counters.items()):
+                    lines.append(
+                        f'{name}{{view="{view}"}} {counters[counter]}')
+            name = 'yatube_db_connection_reuse_ratio'
+            lines.append(
+                f'# HELP {name} Доля запросов к базе без нового соединения.')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {self.reuse_ratio()}')
+        return '\n'.join(lines) + '\n'
+
+    def reuse_ratio(self):
+        requests = opened = 0
+        for counters in self.counters.values():
+            requests += counters['db_requests_total']
+            opened += counters['db_connections_opened_total']
+        if not requests:
+            return 0.0
+        return round(max(0.0, 1 - opened / requests), 4)
+
+
+registry = Registry()
+
+
+def query_wrapper(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += perf_counter() - started
+
+
+def instrument_templates():
+    """Оборачивает рендер шаблонов верхнего уровня (без include)."""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'instrumented', False):
+        return
+    render = Template.render
+
+    def timed_render(self, *args, **kwargs):
+        metrics = current.get()
+        if metrics is None:
+            return render(self, *args, **kwargs)
+        started = perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.template_time += perf_counter() - started
+
+    timed_render.instrumented = True
+    Template.render = timed_render
+
+
+def instrument_cache(cache):
+    """Считает попадания и промахи `get` у экземпляра кеша потока."""
+    if getattr(cache, 'instrumented', False):
+        return
+    get = cache.get
+
+    def counted_get(key, default=None, version=None):
+        value = get(key, default=default, version=version)
+        metrics = current.get()
+        if metrics is not None:
+            if value is default:
+                metrics.cache_misses += 1
+            else:
+                metrics.cache_hits += 1
+        return value
+
+    cache.get = counted_get
+    cache.instrumented = True
@@ -0,0 +1,78 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from . import metrics, routers
+
+
+class MetricsMiddleware:
+    """Собирает по каждой view время ответа, число и время SQL-запросов,
+    попадания в кеш и время рендеринга шаблонов.
+
+    Итоги доступны на `/metrics`, замеры запроса — в `Server-Timing`,
+    который получают только сотрудники или все при DEBUG: по нему видно
+    устройство запросов к базе и кешу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.instrument_templates()
+
+    def __call__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current.set(request_metrics)
+        for alias in settings.CACHES:
+            metrics.instrument_cache(caches[alias])
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.query_wrapper))
+                response = self.get_response(request)
+        finally:
+            metrics.current.reset(token)
+        metrics.registry.observe(request_metrics)
+        if settings.DEBUG or self.is_staff(request):
+            response['Server-Timing'] = request_metrics.server_timing()
+        return response
+
+    @staticmethod
+    def is_staff(request):
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request_metrics = metrics.current.get()
+        if request_metrics is not None and request.resolver_match:
+            request_metrics.view = request.resolver_match.view_name
+
+
+class ReplicaRoutingMiddleware:
+    """Включает чтение с реплик для запроса и закрепляет за основной
+    базой клиента, который только что писал (см. `core.routers`)."""
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = routers.Routing(
+            pinned=request.method not in self.SAFE_METHODS
+            or routers.STICKY_COOKIE in request.COOKIES
+        )
+        token = routers.current.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.current.reset(token)
+        if routing.wrote:
+            response.set_cookie(
+                routers.STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,62 @@
+"""Чтение с реплик, запись в основную базу.
+
+Внутри запроса `ReplicaRoutingMiddleware` кладёт в `current` состояние
+маршрутизации. Чтения безопасных запросов (GET, HEAD) уходят на случайную
+реплику из `DATABASE_REPLICAS`. Запрос, который пишет или пришёл
+небезопасным методом, до конца читает с основной базы, а клиент получает
+cookie, закрепляющую его за основной базой на `REPLICA_STICKY_SECONDS`:
+реплика может отставать, а автор должен сразу видеть свой пост или
+комментарий. Вне запросов (команды, фоновые задачи) всё идёт в основную
+базу, как и таблица кеша `DatabaseCache`: её записи не закрепляют
+клиента за основной базой.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'primary'
+# app_label модели таблицы `django.core.cache.backends.db.DatabaseCache`.
+CACHE_APP_LABEL = 'django_cache'
+
+current = ContextVar('db_routing', default=None)
+
+
+class Routing:
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def pin():
+    """Закрепляет текущий запрос за основной базой без sticky-cookie."""
+    routing = current.get()
+    if routing is not None:
+        routing.pinned = True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = current.get()
+        if (routing is None or routing.pinned
+                or not settings.DATABASE_REPLICAS
+                or model._meta.app_label == CACHE_APP_LABEL):
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        routing = current.get()
+        if routing is not None and model._meta.app_label != CACHE_APP_LABEL:
+            routing.pinned = routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными от основной базы.
+        return db == DEFAULT_DB_ALIAS
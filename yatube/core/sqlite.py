@@ -0,0 +1,71 @@
+"""Настройка соединений SQLite для продакшена.
+
+При каждом новом соединении выполняются PRAGMA из `SQLITE_PRAGMAS`:
+журнал WAL позволяет читать во время записи, `synchronous=NORMAL` в WAL
+не теряет целостности и убирает fsync на каждый коммит, `busy_timeout`
+заставляет писателя ждать блокировку вместо мгновенного «database is
+locked», `mmap_size` и `cache_size` держат горячие страницы в памяти.
+"""
+import re
+
+from django.conf import settings
+
+NAME_RE = re.compile(r'^[a-z_]+$')
+
+# PRAGMA возвращают числа там, где в настройках удобнее имена.
+SYMBOLIC = {
+    'synchronous': {'off': 0, 'normal': 1, 'full': 2, 'extra': 3},
+    'temp_store': {'default': 0, 'file': 1, 'memory': 2},
+}
+REPORTED = ('journal_mode', 'page_size', 'page_count', 'freelist_count')
+
+
+def _pragma_sql(name, value=None):
+    if not NAME_RE.match(name):
+        raise ValueError(f'Недопустимое имя PRAGMA: {name}')
+    if value is None:
+        return f'PRAGMA {name}'
+    return f'PRAGMA {name} = {value}'
+
+
+def configure(sender, connection, **kwargs):
+    """Обработчик `connection_created`."""
+    if connection.vendor != 'sqlite':
+        return
+    # Сырое соединение: PRAGMA не попадают в счётчики запросов.
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        connection.connection.execute(_pragma_sql(name, value)).fetchall()
+
+
+def normalize(name, value):
+    if isinstance(value, str):
+        value = value.lower()
+        return SYMBOLIC.get(name, {}).get(value, value)
+    return value
+
+
+def pragmas(connection):
+    """Текущие значения настраиваемых и справочных PRAGMA."""
+    connection.ensure_connection()
+    names = list(settings.SQLITE_PRAGMAS) + [
+        name for name in REPORTED if name not in settings.SQLITE_PRAGMAS]
+    values = {}
+    for name in names:
+        row = connection.connection.execute(_pragma_sql(name)).fetchone()
+        values[name] = row[0] if row else None
+    return values
+
+
+def mismatches(connection):
+    """PRAGMA, значения которых расходятся с настройками."""
+    current = pragmas(connection)
+    wrong = {
+        name: (normalize(name, expected), current[name])
+        for name, expected in settings.SQLITE_PRAGMAS.items()
+        if normalize(name, expected) != normalize(name, current[name])
+    }
+    if connection.is_in_memory_db():
+        # У базы в памяти нет файла: WAL и mmap к ней неприменимы.
+        wrong.pop('journal_mode', None)
+        wrong.pop('mmap_size', None)
+    return wrong
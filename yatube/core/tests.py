@@ -1,7 +1,30 @@
+import os
+import tempfile
+import time
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
 from django.conf.urls import handler404
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts import caching
+from posts.caching import conditional
+from posts.models import Post, User
+from yatube.caches import build_caches
+from yatube.databases import build_databases
+from . import connections as db_connections, routers, sqlite
+from .middleware import ReplicaRoutingMiddleware
+from .metrics import registry
 
 
 class ErrorURLTest(TestCase):
@@ -10,3 +33,271 @@ class ErrorURLTest(TestCase):
         response = self.client.get(handler404)
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class CacheSettingsTest(TestCase):
+    def test_default_backend_is_locmem(self):
+        caches = build_caches({})
+        self.assertEqual(
+            caches['default']['BACKEND'],
+            'django.core.cache.backends.locmem.LocMemCache'
+        )
+        self.assertEqual(caches['default']['KEY_PREFIX'], 'yatube')
+
+    def test_shared_backends_from_env(self):
+        caches = build_caches({
+            'CACHE_BACKEND': 'memcached',
+            'CACHE_LOCATION': '10.0.0.1:11211,10.0.0.2:11211',
+            'CACHE_KEY_PREFIX': 'prod',
+            'CACHE_VERSION': '3',
+        })['default']
+        self.assertEqual(
+            caches['LOCATION'], ['10.0.0.1:11211', '10.0.0.2:11211'])
+        self.assertEqual((caches['KEY_PREFIX'], caches['VERSION']),
+                         ('prod', 3))
+        caches = build_caches({
+            'CACHE_BACKEND': 'redis', 'CACHE_POOL_SIZE': '5'})['default']
+        self.assertEqual(
+            caches['OPTIONS']['CONNECTION_POOL_KWARGS']['max_connections'], 5)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            build_caches({'CACHE_BACKEND': 'nope'})
+
+    def test_file_backend_is_shared_between_workers(self):
+        """Два экземпляра бэкенда (как два воркера) видят общие ключи."""
+        with tempfile.TemporaryDirectory() as location:
+            config = build_caches({
+                'CACHE_BACKEND': 'file',
+                'CACHE_LOCATION': location,
+            })['default']
+            first = FileBasedCache(location, config)
+            second = FileBasedCache(location, config)
+            first.set('key', 'value')
+            self.assertEqual(second.get('key'), 'value')
+
+
+class MetricsMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def test_server_timing_header(self):
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+
+    def test_server_timing_hidden_from_visitors(self):
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+        with self.settings(DEBUG=True):
+            response = self.client.get(reverse('posts:index'))
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        body = response.content.decode()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            body
+        )
+        self.assertRegex(
+            body, r'yatube_db_queries_total\{view="posts:index"\} [1-9]')
+        self.assertIn('yatube_cache_hits_total{view="posts:index"}', body)
+        # Вторая страница отдана из кеша анонимных страниц без базы.
+        self.assertIn(
+            'yatube_db_requests_total{view="posts:index"} 1.0', body)
+        self.assertIn('yatube_db_connection_reuse_ratio 1.0', body)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_is_restricted(self):
+        """Адрес прокси не открывает метрики, нужен токен или is_staff."""
+        response = self.client.get('/metrics', REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        response = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        self.client.force_login(
+            User.objects.create_user(username='staff', is_staff=True))
+        self.assertEqual(
+            self.client.get('/metrics').status_code, HTTPStatus.OK)
+
+
+def file_connection(directory):
+    """Отдельное соединение с файлом SQLite в каталоге `directory`."""
+    default = connections['default']
+    return type(default)({
+        **default.settings_dict,
+        'NAME': os.path.join(directory, 'db.sqlite3'),
+    })
+
+
+class SQLitePragmaTest(TestCase):
+    def test_pragmas_applied_to_new_file_connection(self):
+        """Новое соединение с файлом базы переходит в WAL и получает
+        PRAGMA из настроек."""
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = file_connection(directory)
+            try:
+                values = sqlite.pragmas(wrapper)
+                self.assertEqual(sqlite.mismatches(wrapper), {})
+            finally:
+                wrapper.close()
+        self.assertEqual(values['journal_mode'], 'wal')
+        self.assertEqual(values['synchronous'], 1)
+        self.assertEqual(values['busy_timeout'], 5000)
+
+    def test_health_command_reports_pragmas(self):
+        out = StringIO()
+        call_command('db_health', stdout=out)
+        self.assertIn('busy_timeout = 5000', out.getvalue())
+
+    def test_health_command_fails_on_mismatch(self):
+        with override_settings(SQLITE_PRAGMAS={'busy_timeout': 1234}):
+            with self.assertRaises(CommandError):
+                call_command('db_health', stdout=StringIO())
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTest(TestCase):
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def handle(self, request, write=False):
+        """Прогоняет запрос через middleware, возвращает ответ и базу,
+        выбранную для чтения внутри view."""
+        chosen = []
+
+        def view(request):
+            if write:
+                self.router.db_for_write(Post)
+            chosen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(request)
+        return response, chosen[0]
+
+    def test_databases_from_env(self):
+        databases = build_databases(
+            {'DATABASE_REPLICAS': '/tmp/r1.sqlite3,/tmp/r2.sqlite3'})
+        self.assertEqual(
+            list(databases), ['default', 'replica1', 'replica2'])
+        self.assertEqual(
+            databases['replica2']['TEST'], {'MIRROR': 'default'})
+
+    def test_reads_outside_request_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_safe_request_reads_from_replica(self):
+        response, database = self.handle(self.factory.get('/'))
+        self.assertIn(database, ('replica1', 'replica2'))
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+    def test_write_pins_client_to_primary(self):
+        """После записи клиент читает с основной базы, пока жива cookie."""
+        response, database = self.handle(
+            self.factory.get('/'), write=True)
+        self.assertEqual(database, 'default')
+        cookie = response.cookies[routers.STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+
+        request = self.factory.get('/')
+        request.COOKIES[routers.STICKY_COOKIE] = cookie.value
+        self.assertEqual(self.handle(request)[1], 'default')
+
+    def test_unsafe_method_reads_from_primary(self):
+        self.assertEqual(self.handle(self.factory.post('/'))[1], 'default')
+
+    def test_database_cache_uses_primary_without_pinning(self):
+        """Таблица DatabaseCache читается с основной базы, а её запись
+        не ставит анониму cookie закрепления."""
+        cache_model = DatabaseCache('cache_table', {}).cache_model_class
+        chosen = []
+
+        def view(request):
+            chosen.append(self.router.db_for_read(cache_model))
+            chosen.append(self.router.db_for_write(cache_model))
+            chosen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(chosen[:2], ['default', 'default'])
+        self.assertIn(chosen[2], ('replica1', 'replica2'))
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+    def test_recently_changed_feed_reads_from_primary(self):
+        """Пока реплики могут отставать от изменения областей, страница,
+        которая попадёт в кеш под новым поколением, читается с основной
+        базы; давно не менявшиеся области читаются с реплики."""
+        cache.clear()
+        chosen = []
+
+        @conditional(lambda request: ['feed'], page_cache=True)
+        def view(request):
+            chosen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        def get(path):
+            request = self.factory.get(path)
+            request.user = AnonymousUser()
+            ReplicaRoutingMiddleware(view)(request)
+            return chosen[-1]
+
+        caching.bump('feed')
+        self.assertEqual(get('/'), 'default')
+        old = time.time() - 60
+        for scope in ('feed', caching.META_SCOPE):
+            cache.set(caching.MODIFIED_KEY.format(scope), old, None)
+        self.assertIn(get('/?page=2'), ('replica1', 'replica2'))
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'posts'))
+
+
+class PersistentConnectionsTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.wrapper = file_connection(directory.name)
+        self.addCleanup(self.wrapper.close)
+        self.wrapper.ensure_connection()
+        patcher = mock.patch.object(
+            db_connections.connections, 'all', return_value=[self.wrapper])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_conn_max_age_from_env(self):
+        databases = build_databases({'DATABASE_CONN_MAX_AGE': '300'})
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 300)
+        self.assertEqual(build_databases({})['default']['CONN_MAX_AGE'], 60)
+
+    def test_health_check_closes_broken_connection(self):
+        db_connections.check()
+        self.assertIsNotNone(self.wrapper.connection)
+        # Соединение закрыто в обход Django, как его закрыла бы база.
+        self.wrapper.connection.close()
+        db_connections.check()
+        self.assertIsNone(self.wrapper.connection)
+        self.wrapper.ensure_connection()
+        with override_settings(DATABASE_CONN_HEALTH_CHECKS=False):
+            self.wrapper.connection.close()
+            db_connections.check()
+        self.assertIsNotNone(self.wrapper.connection)
+
+    def test_pool_size_cap(self):
+        """Сверх предела соединения закрываются после запроса."""
+        self.assertGreaterEqual(db_connections.open_count(), 1)
+        db_connections.enforce_pool_size()
+        self.assertIsNotNone(self.wrapper.connection)
+        with override_settings(DATABASE_POOL_SIZE=0):
+            db_connections.enforce_pool_size()
+        self.assertIsNone(self.wrapper.connection)
@@ -1,13 +1,165 @@
-from typing import List
+import base64
+import binascii
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Union
+
+from django.conf import settings
 from django.core.paginator import Paginator, Page
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
 
 from posts.models import Post
 from yatube.settings import NUM_OF_POST
 
 
+class CursorPage:
+    """Страница keyset-пагинации.
+
+    В отличие от `Page` не знает общего числа объектов и своего номера:
+    вместо этого хранит курсоры соседних страниц.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, cursor, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage {self.cursor or "first"}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по паре (`field`, `pk`).
+
+    Каждая страница — это один запрос `WHERE (field, pk) < (...) LIMIT n`,
+    поэтому глубокие страницы стоят столько же, сколько первая,
+    а `COUNT(*)` не выполняется вовсе. `field` — поле с датой.
+    """
+
+    def __init__(self, object_list: QuerySet, per_page: int,
+                 field: str = 'pub_date', descending: bool = True):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.field = field
+        self.descending = descending
+
+    def encode_cursor(self, obj, reverse: bool = False) -> str:
+        value = getattr(obj, self.field).isoformat()
+        raw = f'{"p" if reverse else "n"}|{value}|{obj.pk}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor: Optional[str]):
+        """Возвращает (reverse, value, pk) или None для первой страницы."""
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+            direction, value, pk = raw.split('|')
+            value = parse_datetime(value)
+            pk = int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            return None
+        if value is None or direction not in ('n', 'p'):
+            return None
+        return direction == 'p', value, pk
+
+    def _ordering(self, reverse: bool):
+        prefix = '-' if self.descending != reverse else ''
+        return f'{prefix}{self.field}', f'{prefix}pk'
+
+    def _after(self, value, pk, reverse: bool) -> Q:
+        lookup = 'lt' if self.descending != reverse else 'gt'
+        return (
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{self.field: value, f'pk__{lookup}': pk})
+        )
+
+    def get_page(self, cursor: Optional[str]) -> CursorPage:
+        position = self.decode_cursor(cursor)
+        reverse = bool(position and position[0])
+        queryset = self.object_list.order_by(*self._ordering(reverse))
+        if position is not None:
+            queryset = queryset.filter(
+                self._after(position[1], position[2], reverse))
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        if reverse and not has_more:
+            # Вернулись к началу ленты: отдаём полную первую страницу.
+            return self.get_page(None)
+        items = items[:self.per_page]
+        if reverse:
+            items.reverse()
+
+        next_cursor = previous_cursor = None
+        if items:
+            if has_more or reverse:
+                next_cursor = self.encode_cursor(items[-1])
+            if position is not None:
+                previous_cursor = self.encode_cursor(items[0], reverse=True)
+        return CursorPage(items, cursor or '', next_cursor, previous_cursor)
+
+
 def pages_obj(
         post_list: List[Post],
         page_number: int,
-        num_of_post: int = NUM_OF_POST) -> Page:
+        num_of_post: int = NUM_OF_POST,
+        cursor: Optional[str] = None,
+        field: str = 'pub_date') -> Union[Page, CursorPage]:
+    """Страница ленты.
+
+    Если передан `cursor` (даже пустой) или включён
+    `settings.CURSOR_PAGINATION`, используется keyset-пагинация
+    по (`field`, `pk`).
+    """
+    if cursor is not None or settings.CURSOR_PAGINATION:
+        return CursorPaginator(
+            post_list, num_of_post, field=field).get_page(cursor)
     paginator = Paginator(post_list, num_of_post)
     return paginator.get_page(page_number)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Разбивает поток на списки по `size` элементов, не читая его
+    целиком в память."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def request_object(request, queryset: QuerySet, **lookup):
+    """Объект из `queryset` или None, найденный один раз за запрос.
+
+    Валидатор условного GET и сама view ищут один и тот же объект:
+    повторный поиск берётся из памяти запроса, а не из базы.
+    """
+    key = (queryset.model._meta.label, tuple(sorted(lookup.items())))
+    found = request.__dict__.setdefault('_request_objects', {})
+    if key not in found:
+        try:
+            found[key] = queryset.get(**lookup)
+        except queryset.model.DoesNotExist:
+            found[key] = None
+    return found[key]
@@ -0,0 +1,20 @@
+from django.contrib import admin
+
+from .models import Message
+
+
+class MessageAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'subject',
+        'recipients',
+        'status',
+        'attempts',
+        'send_after',
+    )
+    list_filter = ('status',)
+    search_fields = ('subject', 'recipients')
+    readonly_fields = ('data', 'last_error')
+
+
+admin.site.register(Message, MessageAdmin)
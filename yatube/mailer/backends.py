@@ -0,0 +1,17 @@
+from django.core.mail.backends.base import BaseEmailBackend
+
+from . import spool
+
+
+class SpoolBackend(BaseEmailBackend):
+    """Почтовый бэкенд, который только ставит письма в очередь.
+
+    Отправляет их фоновая задача `mailer.tasks.flush` через
+    `MAIL_DELIVERY_BACKEND`, поэтому медленный SMTP-сервер не задерживает
+    запросы (например, восстановление пароля).
+    """
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        return spool.spool(email_messages)
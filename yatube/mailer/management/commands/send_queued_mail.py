@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from mailer.models import Message
+from mailer.spool import flush
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из очереди, не дожидаясь воркера задач.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Вернуть в очередь письма, исчерпавшие попытки.',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            Message.objects.filter(status=Message.FAILED).update(
+                status=Message.QUEUED, attempts=0)
+        sent, failed = flush()
+        self.stdout.write(self.style.SUCCESS(
+            f'Писем отправлено: {sent}, с ошибкой: {failed}.'))
@@ -0,0 +1,42 @@
+from django.db import models
+from django.utils import timezone
+
+from core.models import CreatedModel
+
+
+class Message(CreatedModel):
+    """Письмо в очереди на отправку (см. `mailer.spool`)."""
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (SENDING, 'Отправляется'),
+        (FAILED, 'Не отправлено'),
+    )
+
+    subject = models.TextField('Тема')
+    recipients = models.TextField('Получатели')
+    data = models.TextField('Письмо')
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    send_after = models.DateTimeField(
+        'Отправить после', default=timezone.now)
+    locked_until = models.DateTimeField(
+        'Занято до', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        ordering = ('send_after', 'pk')
+        verbose_name = 'Письмо'
+        verbose_name_plural = 'Письма'
+        indexes = [
+            models.Index(
+                fields=['status', 'send_after'],
+                name='message_status_send_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} → {self.recipients}'
@@ -0,0 +1,153 @@
+"""Очередь исходящей почты.
+
+`SpoolBackend` сохраняет письма в `Message` одной вставкой, в той же
+транзакции, что и запрос, и ставит задачу `mailer.tasks.flush`. Задача
+забирает письма пачками по `MAIL_BATCH_SIZE` и отправляет каждую пачку
+через одно соединение `MAIL_DELIVERY_BACKEND` (SMTP в продакшене):
+подключение и аутентификация на сервере — одни на пачку, а не на письмо.
+
+Неотправленные письма повторяются с экспоненциальной задержкой от
+`MAIL_RETRY_DELAY`, после `MAIL_MAX_ATTEMPTS` попыток остаются в
+статусе `failed`. Вложения не поддерживаются.
+"""
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from taskqueue.queue import enqueue_once, lease
+from .models import Message
+
+logger = logging.getLogger(__name__)
+
+FLUSH_TASK = 'mailer.tasks.flush'
+
+
+def serialize(message):
+    if message.attachments:
+        raise ValueError('Вложения в очереди почты не поддерживаются.')
+    return json.dumps({
+        'subject': message.subject,
+        'body': message.body,
+        'from_email': message.from_email,
+        'to': message.to,
+        'cc': message.cc,
+        'bcc': message.bcc,
+        'reply_to': message.reply_to,
+        'headers': message.extra_headers,
+        'alternatives': getattr(message, 'alternatives', []),
+        'content_subtype': message.content_subtype,
+    })
+
+
+def deserialize(data):
+    data = json.loads(data)
+    content_subtype = data.pop('content_subtype')
+    alternatives = [tuple(item) for item in data.pop('alternatives')]
+    message = EmailMultiAlternatives(alternatives=alternatives, **data)
+    message.content_subtype = content_subtype
+    return message
+
+
+def spool(email_messages):
+    """Ставит письма в очередь; возвращает их количество."""
+    Message.objects.bulk_create([
+        Message(
+            subject=message.subject,
+            recipients=', '.join(message.recipients()),
+            data=serialize(message),
+        )
+        for message in email_messages
+    ])
+    schedule_flush()
+    return len(email_messages)
+
+
+def schedule_flush(run_at=None):
+    enqueue_once(FLUSH_TASK, run_at)
+
+
+def _due(now):
+    return (
+        Q(status=Message.QUEUED, send_after__lte=now)
+        | Q(status=Message.SENDING, locked_until__lt=now)
+    )
+
+
+def claim(limit):
+    now = timezone.now()
+    return lease(
+        Message, _due(now), limit,
+        status=Message.SENDING,
+        locked_until=now + timedelta(seconds=settings.TASKS_LEASE),
+    )
+
+
+def _failed(message, error):
+    mine = Message.objects.filter(pk=message.pk, attempts=message.attempts)
+    if message.attempts >= settings.MAIL_MAX_ATTEMPTS:
+        mine.update(
+            status=Message.FAILED, locked_until=None, last_error=error)
+        logger.error('Письмо %s не отправлено: %s', message.pk, error)
+        return
+    delay = settings.MAIL_RETRY_DELAY * 2 ** (message.attempts - 1)
+    mine.update(
+        status=Message.QUEUED,
+        locked_until=None,
+        send_after=timezone.now() + timedelta(seconds=delay),
+        last_error=error,
+    )
+
+
+def _send(connection, message):
+    try:
+        connection.send_messages([deserialize(message.data)])
+    except Exception:
+        _failed(message, traceback.format_exc())
+        return False
+    Message.objects.filter(pk=message.pk, attempts=message.attempts).delete()
+    return True
+
+
+def deliver(limit=None):
+    """Отправляет одну пачку через одно соединение.
+
+    Возвращает (отправлено, с ошибкой).
+    """
+    messages = claim(limit or settings.MAIL_BATCH_SIZE)
+    if not messages:
+        return 0, 0
+    connection = get_connection(settings.MAIL_DELIVERY_BACKEND)
+    try:
+        connection.open()
+    except Exception:
+        error = traceback.format_exc()
+        for message in messages:
+            _failed(message, error)
+        return 0, len(messages)
+    try:
+        sent = sum(_send(connection, message) for message in messages)
+    finally:
+        connection.close()
+    return sent, len(messages) - sent
+
+
+def flush():
+    """Отправляет все готовые письма и планирует отправку повторов."""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = deliver()
+        if not sent and not failed:
+            break
+        total_sent += sent
+        total_failed += failed
+    retry_at = Message.objects.filter(status=Message.QUEUED).aggregate(
+        retry_at=Min('send_after'))['retry_at']
+    if retry_at is not None:
+        schedule_flush(retry_at)
+    return total_sent, total_failed
@@ -0,0 +1,8 @@
+"""Фоновые задачи почты (см. `taskqueue.queue`)."""
+from taskqueue.queue import task
+from . import spool
+
+
+@task
+def flush():
+    spool.flush()
@@ -0,0 +1,178 @@
+import socketserver
+import threading
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives, send_mail
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from taskqueue.models import Task
+from taskqueue.worker import Worker
+from . import spool
+from .models import Message
+
+User = get_user_model()
+
+SMTP = 'django.core.mail.backends.smtp.EmailBackend'
+LOCMEM = 'django.core.mail.backends.locmem.EmailBackend'
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Минимальный SMTP-сервер: принимает письма и запоминает их."""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def read_data(self):
+        lines = []
+        for line in self.rfile:
+            if line == b'.\r\n':
+                break
+            lines.append(line)
+        return b''.join(lines)
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost')
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'RCPT' and self.server.reject in command:
+                self.reply('550 No such user')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                self.server.messages.append(self.read_data())
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    reject = 'bounce@'
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.connections = 0
+        self.messages = []
+
+
+def run_worker():
+    Worker(threads=1).run(once=True)
+
+
+@override_settings(
+    EMAIL_BACKEND='mailer.backends.SpoolBackend',
+    MAIL_DELIVERY_BACKEND=SMTP,
+    EMAIL_HOST='127.0.0.1',
+    EMAIL_USE_TLS=False,
+    EMAIL_HOST_USER='',
+    TASKS_EAGER=False,
+    MAIL_RETRY_DELAY=60,
+    MAIL_MAX_ATTEMPTS=2,
+)
+class MailSpoolTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = SMTPServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.connections = 0
+        self.server.messages = []
+        port = self.server.server_address[1]
+        settings_override = self.settings(EMAIL_PORT=port)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def send(self, *recipients):
+        for recipient in recipients:
+            send_mail('Тема', 'Текст', 'noreply@yatube.ru', [recipient])
+
+    def test_send_mail_only_spools(self):
+        self.send('a@example.com')
+        message = Message.objects.get()
+        self.assertEqual(message.recipients, 'a@example.com')
+        self.assertEqual(self.server.connections, 0)
+        self.assertTrue(Task.objects.filter(name=spool.FLUSH_TASK).exists())
+
+    def test_one_flush_task_for_many_messages(self):
+        self.send('a@example.com', 'b@example.com', 'c@example.com')
+        self.assertEqual(
+            Task.objects.filter(name=spool.FLUSH_TASK).count(), 1)
+
+    @override_settings(MAIL_BATCH_SIZE=2)
+    def test_batches_share_connection(self):
+        self.send('a@example.com', 'b@example.com', 'c@example.com')
+        run_worker()
+        self.assertEqual(len(self.server.messages), 3)
+        self.assertEqual(self.server.connections, 2)
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(Task.objects.exists())
+
+    def test_rejected_message_is_retried(self):
+        self.send('a@example.com', 'bounce@example.com')
+        before = timezone.now()
+        run_worker()
+        self.assertEqual(len(self.server.messages), 1)
+        message = Message.objects.get()
+        self.assertEqual(message.status, Message.QUEUED)
+        self.assertEqual(message.attempts, 1)
+        self.assertIn('No such user', message.last_error)
+        self.assertGreaterEqual(
+            message.send_after, before + timedelta(seconds=60))
+        retry = Task.objects.get(name=spool.FLUSH_TASK)
+        self.assertEqual(retry.run_at, message.send_after)
+
+    def test_unreachable_server_fails_after_max_attempts(self):
+        self.send('a@example.com')
+        with self.settings(EMAIL_PORT=1), self.assertLogs('mailer', 'ERROR'):
+            for _ in range(2):
+                Message.objects.update(send_after=timezone.now())
+                spool.flush()
+        message = Message.objects.get()
+        self.assertEqual(message.status, Message.FAILED)
+        self.assertEqual(message.attempts, 2)
+
+    def test_alternatives_survive_spool(self):
+        email = EmailMultiAlternatives(
+            'Тема', 'Текст', 'noreply@yatube.ru', ['a@example.com'],
+            cc=['b@example.com'])
+        email.attach_alternative('<p>Текст</p>', 'text/html')
+        email.send()
+        restored = spool.deserialize(Message.objects.get().data)
+        self.assertEqual(restored.cc, ['b@example.com'])
+        self.assertEqual(
+            restored.alternatives, [('<p>Текст</p>', 'text/html')])
+
+    @override_settings(MAIL_DELIVERY_BACKEND=LOCMEM)
+    def test_password_reset_mail_is_sent_by_worker(self):
+        User.objects.create_user('reader', 'reader@example.com', 'x')
+        response = self.client.post(
+            reverse('users:password_reset'), {'email': 'reader@example.com'})
+        self.assertRedirects(response, reverse('password_reset_done'))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Message.objects.count(), 1)
+        run_worker()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+        self.assertIn('/auth/reset/', mail.outbox[0].body)
+
+    @override_settings(MAIL_DELIVERY_BACKEND=LOCMEM, TASKS_EAGER=True)
+    def test_eager_mode_sends_immediately(self):
+        self.send('a@example.com')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertFalse(Message.objects.exists())
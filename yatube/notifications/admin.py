@@ -0,0 +1,19 @@
+from django.contrib import admin
+
+from .models import Notification
+
+
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'user',
+        'author',
+        'posts_count',
+        'is_read',
+        'updated',
+    )
+    list_filter = ('is_read',)
+    raw_id_fields = ('user', 'author', 'post')
+
+
+admin.site.register(Notification, NotificationAdmin)
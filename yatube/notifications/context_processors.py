@@ -0,0 +1,13 @@
+from functools import partial
+
+from .inbox import unread_count
+
+
+def unread(request):
+    """Число непрочитанных уведомлений для шапки.
+
+    Считается лениво, только если шаблон его выводит.
+    """
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_notifications': partial(unread_count, request.user.pk)}
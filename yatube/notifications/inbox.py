@@ -0,0 +1,88 @@
+"""Уведомления подписчиков о новых постах.
+
+Публикация поста только ставит задачу `notify_followers`; задача
+раскладывает уведомления по подписчикам вне запроса. Подписчикам с
+непрочитанным свежим уведомлением от автора одно `UPDATE` дописывает
+пост в дайджест, остальным уведомления вставляются многострочными
+`INSERT` по `NOTIFICATIONS_BATCH_SIZE` строк.
+
+Число непрочитанных для шапки хранится в кеше под ключом с поколением
+области `user:<id>` (см. `posts.caching`): новая пачка уведомлений
+сбрасывает поколения своих получателей одним `delete_many`.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from posts import caching
+from posts.models import Follow, Post
+from .models import Notification
+
+UNREAD_KEY = 'notifications:unread:{}:{}'
+
+
+def notify_followers(post_id):
+    """Уведомляет подписчиков автора о посте. Возвращает число новых
+    уведомлений.
+
+    Повторное выполнение (задачи доставляются «хотя бы один раз») не
+    дублирует ни уведомления, ни счётчики дайджестов.
+    """
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is None:
+        return 0
+    now = timezone.now()
+    pending = Notification.objects.filter(
+        author_id=author_id,
+        is_read=False,
+        updated__gte=now - timedelta(
+            seconds=settings.NOTIFICATIONS_DIGEST_WINDOW),
+    )
+    pending.exclude(post_id=post_id).update(
+        posts_count=F('posts_count') + 1, post_id=post_id, updated=now)
+    followers = Follow.objects.filter(
+        author_id=author_id, user__isnull=False,
+    ).exclude(
+        user__in=pending.values('user')
+    ).order_by('pk').values_list('pk', 'user_id')
+    created = 0
+    last_pk = 0
+    size = settings.NOTIFICATIONS_BATCH_SIZE
+    while True:
+        chunk = list(followers.filter(pk__gt=last_pk)[:size])
+        if not chunk:
+            return created
+        last_pk = chunk[-1][0]
+        users = [user_id for _, user_id in chunk]
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=user_id,
+                author_id=author_id,
+                post_id=post_id,
+                updated=now,
+            )
+            for user_id in users
+        ], batch_size=size)
+        caching.forget(*map(caching.user_scope, users))
+        created += len(users)
+
+
+def unread_count(user_id):
+    key = UNREAD_KEY.format(
+        user_id, caching.generation(caching.user_scope(user_id)))
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(
+            user_id=user_id, is_read=False).count()
+        cache.set(key, count, settings.FEED_CACHE_TIMEOUT)
+    return count
+
+
+def mark_read(user_id):
+    if Notification.objects.filter(user_id=user_id, is_read=False).update(
+            is_read=True):
+        caching.bump(caching.user_scope(user_id))
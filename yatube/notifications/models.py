@@ -0,0 +1,55 @@
+from django.db import models
+from django.utils import timezone
+
+from core.models import CreatedModel
+from posts.models import Post, User
+
+
+class Notification(CreatedModel):
+    """Уведомление подписчику о новых постах автора.
+
+    Посты, вышедшие в пределах `NOTIFICATIONS_DIGEST_WINDOW`, пока
+    уведомление не прочитано, собираются в одну запись-дайджест: растёт
+    `posts_count`, а `post` указывает на последний пост.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+        verbose_name='Получатель',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Последний пост',
+    )
+    posts_count = models.PositiveIntegerField('Новых постов', default=1)
+    updated = models.DateTimeField('Дата обновления', default=timezone.now)
+    is_read = models.BooleanField('Прочитано', default=False)
+
+    class Meta:
+        ordering = ('-updated', '-pk')
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+        indexes = [
+            models.Index(
+                fields=['user', 'is_read'],
+                name='notification_user_read_idx',
+            ),
+            models.Index(
+                fields=['author', 'is_read', 'updated'],
+                name='notification_digest_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.author} → {self.user}: {self.posts_count}'
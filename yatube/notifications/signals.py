@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from posts.models import Post
+from .tasks import notify_followers
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, **kwargs):
+    """Подписчики уведомляются фоновой задачей, а не в запросе."""
+    if created:
+        notify_followers.delay(instance.pk)
@@ -0,0 +1,8 @@
+"""Фоновые задачи уведомлений (см. `taskqueue.queue`)."""
+from taskqueue.queue import task
+from . import inbox
+
+
+@task
+def notify_followers(post_id):
+    inbox.notify_followers(post_id)
@@ -0,0 +1,126 @@
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Follow, Post, User
+from taskqueue.models import Task
+from .inbox import notify_followers, unread_count
+from .models import Notification
+
+
+@override_settings(TASKS_EAGER=False, NOTIFICATIONS_DIGEST_WINDOW=3600)
+class NotificationsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.readers = [
+            User.objects.create_user(username=f'reader{index}')
+            for index in range(5)
+        ]
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=cls.author) for reader in cls.readers)
+
+    def setUp(self):
+        cache.clear()
+        self.reader = self.readers[0]
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def publish(self, text='Пост'):
+        post = Post.objects.create(author=self.author, text=text)
+        notify_followers(post.pk)
+        return post
+
+    def test_publishing_only_enqueues_task(self):
+        """В запросе нет работы на каждого подписчика."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        task = Task.objects.get(name='notifications.tasks.notify_followers')
+        self.assertIn(str(post.pk), task.payload)
+        self.assertFalse(Notification.objects.exists())
+
+    @override_settings(NOTIFICATIONS_BATCH_SIZE=2)
+    def test_followers_notified_in_batches(self):
+        post = Post.objects.create(author=self.author, text='Пост')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(notify_followers(post.pk), 5)
+        inserts = [
+            query for query in queries
+            if query['sql'].startswith('INSERT INTO "notifications_')
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertEqual(
+            set(Notification.objects.values_list('user', flat=True)),
+            {reader.pk for reader in self.readers},
+        )
+
+    def test_burst_collapses_into_digest(self):
+        self.publish('Первый')
+        latest = self.publish('Второй')
+        notification = Notification.objects.get(user=self.reader)
+        self.assertEqual(notification.posts_count, 2)
+        self.assertEqual(notification.post, latest)
+        self.assertEqual(Notification.objects.count(), len(self.readers))
+
+    def test_repeated_task_is_idempotent(self):
+        post = self.publish()
+        self.assertEqual(notify_followers(post.pk), 0)
+        notification = Notification.objects.get(user=self.reader)
+        self.assertEqual(notification.posts_count, 1)
+
+    def test_read_or_old_notifications_start_new_digest(self):
+        self.publish()
+        Notification.objects.filter(user=self.readers[1]).update(
+            updated=timezone.now() - timedelta(hours=2))
+        Notification.objects.filter(user=self.readers[2]).update(
+            is_read=True)
+        self.publish()
+        self.assertEqual(
+            Notification.objects.filter(user=self.reader).count(), 1)
+        self.assertEqual(
+            Notification.objects.filter(user=self.readers[1]).count(), 2)
+        self.assertEqual(
+            Notification.objects.filter(user=self.readers[2]).count(), 2)
+
+    def test_unread_count_is_cached_and_invalidated(self):
+        self.assertEqual(unread_count(self.reader.pk), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.reader.pk), 0)
+        self.publish()
+        self.assertEqual(unread_count(self.reader.pk), 1)
+
+    def test_header_shows_unread_count(self):
+        self.publish()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'badge')
+        response = self.client.get(reverse('notifications:index'))
+        self.assertEqual(len(response.context['notifications']), 1)
+        self.assertFalse(
+            Notification.objects.filter(is_read=False, user=self.reader)
+            .exists())
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'badge')
+
+    def test_reading_notifications_changes_feed_etag(self):
+        """Шапка с числом непрочитанных не отдаётся из кеша браузера."""
+        self.publish()
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        self.client.get(reverse('notifications:index'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_post_create_notifies_followers(self):
+        author = Client()
+        author.force_login(self.author)
+        author.post(reverse('posts:post_create'), {'text': 'Новый пост'})
+        self.assertEqual(Notification.objects.count(), len(self.readers))
+
+    def test_guest_redirected_to_login(self):
+        response = Client().get(reverse('notifications:index'))
+        self.assertEqual(response.status_code, 302)
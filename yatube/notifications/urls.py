@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'notifications'
+
+urlpatterns = [
+    path(
+        '',
+        views.index,
+        name='index'),
+]
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render
+
+from .inbox import mark_read
+
+
+@login_required
+def index(request):
+    """Последние уведомления; открытие страницы отмечает их прочитанными."""
+    notifications = list(
+        request.user.notifications.select_related('author', 'post')
+        [:settings.NOTIFICATIONS_PAGE_SIZE]
+    )
+    mark_read(request.user.pk)
+    context = {
+        'notifications': notifications,
+    }
+    return render(request, 'notifications/index.html', context)
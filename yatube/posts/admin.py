@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.http import Http404, StreamingHttpResponse
+from django.urls import path
 
+from . import exporting
 from .models import Post, Group, Comment, Follow
 
 
@@ -16,6 +19,36 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_urls(self):
+        return [
+            path(
+                'export/<str:kind>/',
+                self.admin_site.admin_view(self.export_view),
+                name='posts_export',
+            ),
+        ] + super().get_urls()
+
+    def export_view(self, request, kind):
+        """Потоковая выгрузка: ?format=jsonl|csv, ?gzip=1."""
+        if not request.user.is_superuser:
+            raise Http404
+        fmt = request.GET.get('format', 'jsonl')
+        if kind not in exporting.KINDS or fmt not in exporting.FORMATS:
+            raise Http404
+        compress = request.GET.get('gzip') == '1'
+        response = StreamingHttpResponse(
+            exporting.stream(kind, fmt, compress=compress),
+            content_type=(
+                'application/gzip' if compress
+                else exporting.CONTENT_TYPES[fmt]
+            ),
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="%s"'
+            % exporting.filename(kind, fmt, compress)
+        )
+        return response
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
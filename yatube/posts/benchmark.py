@@ -0,0 +1,230 @@
+"""Нагрузочные замеры горячих путей приложения posts.
+
+`seed` наполняет базу синтетическими данными, `run` прогоняет запросы
+к view через тестовый клиент Django и считает пропускную способность
+и перцентили задержки. Результаты — словарь, пригодный для JSON и
+сравнения с предыдущим прогоном.
+"""
+import platform
+import random
+from itertools import accumulate
+from time import perf_counter
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from faker import Faker
+
+from core.utils import batched
+from . import counters, search, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 2000
+SCENARIOS = (
+    'index',
+    'group_posts',
+    'profile',
+    'post_detail',
+    'follow_index',
+    'post_create',
+)
+
+
+def _insert(model, objects, report):
+    total = 0
+    for batch in batched(objects, BATCH_SIZE):
+        with transaction.atomic():
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+        report(f'{model._meta.verbose_name_plural}: {total}')
+    return total
+
+
+def seed(users=1000, groups=20, posts=10000, follows=20, comments=3,
+         seed_value=42, report=print):
+    """Создаёт набор данных. Подписки распределены по степенному
+    закону: у немногих авторов много подписчиков, как в жизни."""
+    rng = random.Random(seed_value)
+    fake = Faker('ru_RU')
+    fake.seed_instance(seed_value)
+    sentences = [fake.sentence(nb_words=12) for _ in range(500)]
+
+    def text(words):
+        return ' '.join(rng.choice(sentences) for _ in range(words))
+
+    _insert(User, (
+        User(username=f'bench{index}', password='!')
+        for index in range(users)
+    ), report)
+    _insert(Group, (
+        Group(
+            title=fake.catch_phrase()[:200],
+            slug=f'bench-group-{index}',
+            description=text(2),
+        )
+        for index in range(groups)
+    ), report)
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+    # Вес автора ~ 1 / rank: популярность по закону Ципфа.
+    weights = list(accumulate(
+        1 / rank for rank in range(1, len(user_ids) + 1)))
+
+    _insert(Post, (
+        Post(
+            author_id=rng.choices(user_ids, cum_weights=weights)[0],
+            group_id=rng.choice(group_ids + [None]),
+            text=text(rng.randint(1, 4)),
+        )
+        for _ in range(posts)
+    ), report)
+    _insert(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in set(
+            rng.choices(user_ids, cum_weights=weights, k=follows))
+        if author_id != user_id
+    ), report)
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    _insert(Comment, (
+        Comment(
+            post_id=rng.choice(post_ids),
+            author_id=rng.choice(user_ids),
+            text=rng.choice(sentences),
+        )
+        for _ in range(len(post_ids) * comments)
+    ), report)
+
+    # bulk_create обходит сигналы: пересчитываем производные данные.
+    report('Пересчёт счётчиков, лент и поискового индекса')
+    counters.recount()
+    timeline.rebuild()
+    search.get_backend().rebuild()
+
+
+def percentile(values, percent):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, round(percent / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class Runner:
+    def __init__(self, requests=200, warmup=20, cold_cache=False,
+                 seed_value=42):
+        self.requests = requests
+        self.warmup = warmup
+        self.cold_cache = cold_cache
+        self.rng = random.Random(seed_value)
+        self.user_ids = list(
+            Follow.objects.values_list('user_id', flat=True).distinct()
+            or User.objects.values_list('pk', flat=True)
+        )
+        self.usernames = list(
+            Post.objects.values_list('author__username', flat=True)
+            .distinct()[:1000]
+        )
+        self.slugs = list(Group.objects.values_list('slug', flat=True))
+        self.post_ids = list(
+            Post.objects.values_list('pk', flat=True)[:10000])
+
+    def client(self):
+        client = Client()
+        client.force_login(User.objects.get(pk=self.rng.choice(
+            self.user_ids)))
+        return client
+
+    def request(self, scenario, client):
+        if scenario == 'index':
+            return client.get(reverse('posts:index'))
+        if scenario == 'group_posts':
+            return client.get(reverse(
+                'posts:group_list',
+                kwargs={'slug': self.rng.choice(self.slugs)},
+            ))
+        if scenario == 'profile':
+            return client.get(reverse(
+                'posts:profile',
+                kwargs={'username': self.rng.choice(self.usernames)},
+            ))
+        if scenario == 'post_detail':
+            return client.get(reverse(
+                'posts:post_detail',
+                kwargs={'post_id': self.rng.choice(self.post_ids)},
+            ))
+        if scenario == 'follow_index':
+            return client.get(reverse('posts:follow_index'))
+        if scenario == 'post_create':
+            return client.post(
+                reverse('posts:post_create'),
+                {'text': f'Пост нагрузочного теста {self.rng.random()}'},
+            )
+        raise ValueError(f'Неизвестный сценарий {scenario}')
+
+    def measure(self, scenario):
+        client = self.client()
+        for _ in range(self.warmup):
+            self.request(scenario, client)
+        timings = []
+        queries = 0
+        started = perf_counter()
+        for _ in range(self.requests):
+            if self.cold_cache:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                request_started = perf_counter()
+                response = self.request(scenario, client)
+                timings.append(perf_counter() - request_started)
+            if response.status_code >= 400:
+                raise RuntimeError(
+                    f'{scenario}: ответ {response.status_code}')
+            queries += len(captured)
+        elapsed = perf_counter() - started
+        return {
+            'requests': self.requests,
+            'throughput_rps': round(self.requests / elapsed, 2),
+            'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'queries_per_request': round(queries / self.requests, 2),
+        }
+
+
+def run(scenarios=SCENARIOS, **options):
+    runner = Runner(**options)
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'dataset': {
+            'users': User.objects.count(),
+            'groups': Group.objects.count(),
+            'posts': Post.objects.count(),
+            'follows': Follow.objects.count(),
+            'comments': Comment.objects.count(),
+        },
+        'results': {
+            scenario: runner.measure(scenario) for scenario in scenarios
+        },
+    }
+
+
+def compare(results, baseline, threshold=10):
+    """Список сценариев, где p50 вырос больше чем на `threshold` %."""
+    regressions = []
+    for scenario, current in results['results'].items():
+        previous = baseline.get('results', {}).get(scenario)
+        if not previous or not previous['p50_ms']:
+            continue
+        change = (current['p50_ms'] / previous['p50_ms'] - 1) * 100
+        if change > threshold:
+            regressions.append((scenario, round(change, 1)))
+    return regressions
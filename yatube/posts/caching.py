@@ -0,0 +1,240 @@
+"""Версионированные ключи кеша фрагментов лент.
+
+Каждой области (главная, группа, профиль) соответствует счётчик
+поколения в кеше. Сигналы увеличивают его при изменении `Post`, `Group`
+или пользователя, а версия входит в ключ `{% cache %}`: старые фрагменты
+просто перестают читаться, поэтому TTL можно держать долгим.
+
+Те же поколения служат валидаторами условных GET: `conditional` строит
+из них `ETag` и `Last-Modified` без единого запроса к базе и отвечает
+304, не вызывая view, а анонимным пользователям может отдавать готовую
+страницу из кеша.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from core import routers
+from core.utils import request_object
+from .models import Group, User
+
+GENERATION_KEY = 'posts:generation:{}'
+MODIFIED_KEY = 'posts:modified:{}'
+PAGE_KEY = 'posts:page:{}'
+# Общая область для данных, видимых во всех лентах: названия групп,
+# имена авторов.
+META_SCOPE = 'meta'
+
+
+def generation(scope):
+    key = GENERATION_KEY.format(scope)
+    value = cache.get(key)
+    if value is None:
+        # Начинаем с текущего времени: если счётчик вытеснен из кеша,
+        # новое поколение всё равно больше любого прежнего.
+        now = time.time()
+        cache.add(key, int(now * 1000), None)
+        cache.add(MODIFIED_KEY.format(scope), now, None)
+        value = cache.get(key)
+    return value
+
+
+def bump(*scopes):
+    now = time.time()
+    for scope in scopes:
+        try:
+            cache.incr(GENERATION_KEY.format(scope))
+        except ValueError:
+            generation(scope)
+        cache.set(MODIFIED_KEY.format(scope), now, None)
+
+
+def forget(*scopes):
+    """Сбрасывает поколения областей одним обращением к кешу.
+
+    Для массовой инвалидации вместо `bump`: следующее чтение начнёт
+    поколение заново от текущего времени.
+    """
+    cache.delete_many([GENERATION_KEY.format(scope) for scope in scopes])
+    cache.set_many(
+        {MODIFIED_KEY.format(scope): time.time() for scope in scopes}, None)
+
+
+def user_scope(user_id):
+    """Область данных шапки вошедшего пользователя (уведомления)."""
+    return f'user:{user_id}'
+
+
+def feed_cache(scope):
+    """Контекст для `{% cache cache_timeout ... cache_version %}`."""
+    return {
+        'cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'cache_version': f'{generation(scope)}.{generation(META_SCOPE)}',
+    }
+
+
+def post_scopes(author_id, group_id):
+    scopes = ['index', f'profile:{author_id}']
+    if group_id:
+        scopes.append(f'group:{group_id}')
+    return scopes
+
+
+def comment_scopes(post_id):
+    return [f'comments:{post_id}']
+
+
+def follow_scopes(user_id, author_id):
+    return [f'following:{user_id}', f'followers:{author_id}']
+
+
+def feed_group(request, slug):
+    return request_object(request, Group.objects.all(), slug=slug)
+
+
+def feed_author(request, username):
+    return request_object(
+        request, User.objects.select_related('counters'), username=username)
+
+
+def group_feed_scopes(request, slug):
+    """Области ленты группы; None, если группы нет."""
+    group = feed_group(request, slug)
+    return group and [f'group:{group.pk}']
+
+
+def profile_scopes(request, username):
+    """Области профиля: посты и счётчики подписок автора, а для
+    вошедшего пользователя — и его собственные подписки (кнопка
+    «Подписаться»)."""
+    author = feed_author(request, username)
+    if author is None:
+        return None
+    author_id = author.pk
+    scopes = [
+        f'profile:{author_id}',
+        f'followers:{author_id}',
+        f'following:{author_id}',
+    ]
+    if request.user.is_authenticated:
+        scopes.append(f'following:{request.user.pk}')
+    return scopes
+
+
+def last_modified(scopes):
+    """Время последнего изменения областей или None, если неизвестно."""
+    values = cache.get_many([MODIFIED_KEY.format(scope) for scope in scopes])
+    if len(values) < len(scopes):
+        return None
+    return datetime.fromtimestamp(max(values.values()), timezone.utc)
+
+
+def validators(request, scopes):
+    """Хеш для `ETag` и время изменения (секунды) для `Last-Modified`."""
+    versions = '.'.join(str(generation(scope)) for scope in scopes)
+    user_id = request.user.pk if request.user.is_authenticated else ''
+    digest = hashlib.md5(
+        f'{request.get_full_path()}|{user_id}|{versions}'.encode()
+    ).hexdigest()
+    modified = last_modified(scopes)
+    return digest, modified and int(modified.timestamp())
+
+
+def store_page(digest, response):
+    """Сохраняет страницу для анонимов, если она не ставит cookie."""
+    if not response.cookies:
+        cache.set(
+            PAGE_KEY.format(digest), response, settings.PAGE_CACHE_TIMEOUT)
+
+
+def pin_until_replicas_catch_up(timestamp):
+    """Закрепляет запрос за основной базой, если с изменения областей
+    (секунды, `validators`) реплики могли его ещё не получить."""
+    # `timestamp` округлён вниз до секунды, отсюда `+ 1`.
+    if not timestamp or (
+            time.time() - timestamp <= settings.REPLICA_STICKY_SECONDS + 1):
+        routers.pin()
+
+
+def conditional(get_scopes, page_cache=False):
+    """Декоратор view с условным GET по поколениям областей.
+
+    `get_scopes(request, *args, **kwargs)` возвращает список областей,
+    от которых зависит ответ, или None, если проверка неприменима (тогда
+    view вызывается как обычно). В `ETag` входят полный путь с
+    параметрами и пользователь, поэтому разные страницы и разные
+    пользователи получают разные валидаторы. Для вошедшего пользователя
+    в них входит и его область `user:<id>`: шапка показывает число
+    непрочитанных уведомлений.
+
+    С `page_cache=True` ответы анонимным пользователям целиком хранятся
+    в кеше под ключом из того же `ETag`: изменение любой области меняет
+    ключ, и старая страница больше не читается. Вошедшие пользователи
+    видят свою шапку и переключатель лент, для них кеш не используется.
+
+    Страница и фрагменты `{% cache %}` попадают в кеш под новым
+    поколением, поэтому, пока реплики могут не догнать изменение
+    областей (`REPLICA_STICKY_SECONDS`), view читает с основной базы.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            scopes = None
+            if request.method in ('GET', 'HEAD'):
+                scopes = get_scopes(request, *args, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            scopes = [*scopes, META_SCOPE]
+            if request.user.is_authenticated:
+                scopes.append(user_scope(request.user.pk))
+            digest, timestamp = validators(request, scopes)
+            etag = quote_etag(digest)
+            use_cache = page_cache and not request.user.is_authenticated
+            response = get_conditional_response(
+                request, etag=etag, last_modified=timestamp
+            ) or use_cache and cache.get(PAGE_KEY.format(digest))
+            if response:
+                return response
+            pin_until_replicas_catch_up(timestamp)
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            response.setdefault('ETag', etag)
+            if timestamp:
+                response.setdefault('Last-Modified', http_date(timestamp))
+            if use_cache:
+                store_page(digest, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def cache_headers(view):
+    """`Cache-Control` и `Vary` для лент.
+
+    Анонимные страницы одинаковы для всех, их может хранить обратный
+    прокси `FEED_HTTP_MAX_AGE` секунд; страницы вошедших пользователей
+    браузер хранит у себя и перепроверяет по `ETag` перед показом.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        if (request.method in ('GET', 'HEAD')
+                and response.status_code in (200, 304)):
+            if request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(
+                    response, public=True,
+                    max_age=settings.FEED_HTTP_MAX_AGE)
+            patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
@@ -0,0 +1,124 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарным `UPDATE ... SET x = x + 1`, поэтому
+параллельные запросы не теряют приращений. `recount` пересчитывает всё
+заново набором агрегирующих подзапросов.
+"""
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def bump_user(user_id, **deltas):
+    """Изменяет счётчики пользователя на `deltas`.
+
+    Строка счётчиков создаётся пересчётом, если её ещё нет; уменьшение
+    отсутствующей строки игнорируется (пользователь удаляется).
+    """
+    UserCounter = django_apps.get_model('posts', 'UserCounter')
+    counters = UserCounter.objects.filter(user_id=user_id)
+    for field, delta in deltas.items():
+        if delta < 0:
+            counters = counters.filter(**{f'{field}__gte': -delta})
+    updated = counters.update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+    if not updated and any(delta > 0 for delta in deltas.values()):
+        UserCounter.objects.bulk_create(
+            user_counters(pk=user_id), ignore_conflicts=True)
+
+
+def refresh_users(user_ids):
+    """Пересчитывает счётчики подписок пользователей агрегатами по
+    `Follow` одним `UPDATE` на всех.
+
+    В отличие от приращений, абсолютные значения верны, даже если часть
+    подписок уже учёл параллельный запрос.
+    """
+    Follow = django_apps.get_model('posts', 'Follow')
+    UserCounter = django_apps.get_model('posts', 'UserCounter')
+    user_ids = set(user_ids)
+    counters = UserCounter.objects.filter(user_id__in=user_ids)
+    updated = counters.update(
+        followers_count=_count(Follow, 'author'),
+        following_count=_count(Follow, 'user'),
+    )
+    if updated < len(user_ids):
+        missing = user_ids - set(counters.values_list('user_id', flat=True))
+        UserCounter.objects.bulk_create(
+            user_counters(pk__in=missing), ignore_conflicts=True)
+
+
+def recount_posts(user_id):
+    """Пересчитывает число постов пользователя агрегатом по `Post`."""
+    Post = django_apps.get_model('posts', 'Post')
+    UserCounter = django_apps.get_model('posts', 'UserCounter')
+    updated = UserCounter.objects.filter(user_id=user_id).update(
+        posts_count=_count(Post, 'author'))
+    if not updated:
+        UserCounter.objects.bulk_create(
+            user_counters(pk=user_id), ignore_conflicts=True)
+
+
+def bump_post(post_id, delta):
+    Post = django_apps.get_model('posts', 'Post')
+    Post.objects.filter(
+        pk=post_id, comments_count__gte=-delta
+    ).update(comments_count=F('comments_count') + delta)
+
+
+def get_counters(user):
+    """Счётчики пользователя; нулевые, если строки ещё нет."""
+    UserCounter = django_apps.get_model('posts', 'UserCounter')
+    return getattr(user, 'counters', None) or UserCounter(user=user)
+
+
+def _count(model, field):
+    subquery = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(subquery, output_field=IntegerField()), 0)
+
+
+def user_counters(apps=django_apps, **filters):
+    """Итератор свежепосчитанных `UserCounter` для пользователей."""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    users = User.objects.filter(**filters).annotate(
+        posts_total=_count(Post, 'author'),
+        followers_total=_count(Follow, 'author'),
+        following_total=_count(Follow, 'user'),
+    ).values_list(
+        'pk', 'posts_total', 'followers_total', 'following_total')
+    for pk, posts, followers, following in users.iterator():
+        yield UserCounter(
+            user_id=pk,
+            posts_count=posts,
+            followers_count=followers,
+            following_count=following,
+        )
+
+
+def recount(apps=django_apps):
+    """Пересчитывает все счётчики. Возвращает число пользователей."""
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    with transaction.atomic():
+        Post.objects.update(comments_count=_count(Comment, 'post'))
+        UserCounter.objects.all().delete()
+        batch = []
+        total = 0
+        for counter in user_counters(apps):
+            batch.append(counter)
+            if len(batch) == BATCH_SIZE:
+                UserCounter.objects.bulk_create(batch)
+                total += len(batch)
+                batch = []
+        UserCounter.objects.bulk_create(batch)
+    return total + len(batch)
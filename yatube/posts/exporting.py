@@ -0,0 +1,97 @@
+"""Потоковая выгрузка постов, комментариев и подписок.
+
+Строки читаются через `iterator(chunk_size=...)` (на PostgreSQL это
+серверный курсор) и сразу сериализуются в JSONL или CSV, при желании со
+сжатием gzip, поэтому память не зависит от размера таблиц. Формат
+записей совпадает с тем, что принимает `importing`.
+"""
+import csv
+import json
+import zlib
+
+from .models import Comment, Follow, Post
+
+CHUNK_SIZE = 2000
+FORMATS = ('jsonl', 'csv')
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+EXPORTS = {
+    'posts': (
+        Post,
+        ('id', 'author', 'group', 'text', 'pub_date', 'image'),
+        ('pk', 'author__username', 'group__slug', 'text', 'pub_date',
+         'image'),
+    ),
+    'comments': (
+        Comment,
+        ('id', 'post', 'author', 'text', 'created'),
+        ('pk', 'post_id', 'author__username', 'text', 'created'),
+    ),
+    'follows': (
+        Follow,
+        ('user', 'author'),
+        ('user__username', 'author__username'),
+    ),
+}
+KINDS = tuple(EXPORTS)
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def records(kind, chunk_size=CHUNK_SIZE):
+    """Итератор словарей по всей таблице в порядке первичного ключа."""
+    model, names, fields = EXPORTS[kind]
+    rows = model.objects.order_by('pk').values_list(*fields)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield dict(zip(names, map(_plain, row)))
+
+
+class _Line:
+    """Буфер для `csv.writer`, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def serialize(kind, fmt='jsonl', chunk_size=CHUNK_SIZE):
+    """Итератор текстовых строк выгрузки."""
+    if fmt == 'csv':
+        names = EXPORTS[kind][1]
+        writer = csv.DictWriter(_Line(), fieldnames=names)
+        yield writer.writerow(dict(zip(names, names)))
+        for record in records(kind, chunk_size):
+            yield writer.writerow(record)
+        return
+    for record in records(kind, chunk_size):
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def stream(kind, fmt='jsonl', compress=False, chunk_size=CHUNK_SIZE):
+    """Итератор байтовых кусков выгрузки, склеенных до ~64 КБ."""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = []
+    size = 0
+    for line in serialize(kind, fmt, chunk_size):
+        data = line.encode('utf-8')
+        if compressor is not None:
+            data = compressor.compress(data)
+        buffer.append(data)
+        size += len(data)
+        if size >= 65536:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if compressor is not None:
+        buffer.append(compressor.flush())
+    tail = b''.join(buffer)
+    if tail:
+        yield tail
+
+
+def filename(kind, fmt='jsonl', compress=False):
+    return f'{kind}.{fmt}' + ('.gz' if compress else '')
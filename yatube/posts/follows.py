@@ -0,0 +1,153 @@
+"""Граф подписок: кешированное множество авторов пользователя.
+
+Множество id авторов, на которых подписан пользователь, хранится в кеше
+под ключом с поколением области `following:<id>`, которое сигналы
+`Follow` увеличивают при подписке и отписке. Поэтому проверка «подписан
+ли» — это поиск в множестве, а не запрос к базе, а страница постов или
+авторов размечается состоянием подписки без запроса на каждый элемент.
+
+Уникальность пары (пользователь, автор) гарантирует индекс базы:
+`follow` не проверяет её заранее, а при гонке двух запросов второй
+получает IntegrityError и просто сообщает, что подписка уже была.
+"""
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import BooleanField, Exists, F, OuterRef, Value
+
+from . import caching, counters, timeline
+from .models import Follow, UserCounter
+
+FOLLOWING_KEY = 'follows:{}:{}'
+
+
+def following_ids(user):
+    """frozenset id авторов, на которых подписан пользователь.
+
+    Один раз за запрос читается из кеша и запоминается на объекте
+    пользователя.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    ids = getattr(user, '_following_ids', None)
+    if ids is None:
+        key = FOLLOWING_KEY.format(
+            user.pk, caching.generation(f'following:{user.pk}'))
+        ids = cache.get(key)
+        if ids is None:
+            ids = frozenset(
+                Follow.objects.filter(user=user).values_list(
+                    'author_id', flat=True))
+            cache.set(key, ids, settings.FEED_CACHE_TIMEOUT)
+        user._following_ids = ids
+    return ids
+
+
+def is_following(user, author):
+    return author.pk in following_ids(user)
+
+
+def mark_following(user, objects, author_id=attrgetter('author_id'),
+                   attr='is_following'):
+    """Проставляет `attr` объектам страницы по кешированному множеству.
+
+    `author_id(obj)` возвращает id автора объекта; для списка самих
+    пользователей — `attrgetter('pk')`.
+    """
+    ids = following_ids(user)
+    for obj in objects:
+        setattr(obj, attr, author_id(obj) in ids)
+    return objects
+
+
+def annotate_following(queryset, user, author_field='author',
+                       attr='is_following'):
+    """Добавляет к выборке состояние подписки одним подзапросом EXISTS.
+
+    Для выборок, которые всё равно читаются из базы: разметка не требует
+    ни отдельного запроса, ни загрузки множества подписок.
+    """
+    if not user.is_authenticated:
+        return queryset.annotate(
+            **{attr: Value(False, output_field=BooleanField())})
+    follows = Follow.objects.filter(user=user, author=OuterRef(author_field))
+    return queryset.annotate(**{attr: Exists(follows)})
+
+
+def _forget(user):
+    user.__dict__.pop('_following_ids', None)
+
+
+def follow(user, author):
+    """Подписывает пользователя на автора. True, если подписка новая.
+
+    Подписка на себя отклоняется ограничением базы так же, как дубль.
+    """
+    _forget(user)
+    try:
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow(user, author):
+    """Отписывает пользователя от автора. True, если подписка была."""
+    _forget(user)
+    deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+    return bool(deleted)
+
+
+def follow_many(user, authors):
+    """Подписывает пользователя на авторов одним многострочным INSERT.
+
+    `bulk_create` не вызывает сигналы `Follow`, поэтому счётчики, ленты
+    и поколения кеша обновляются здесь же, пачкой; счётчики берутся из
+    агрегатов, а не `+1` на каждую подписку. Возвращает авторов,
+    подписка на которых новая.
+    """
+    candidates = [author for author in authors if author.pk != user.pk]
+    with transaction.atomic():
+        # Первым идёт запись: пустой UPDATE берёт блокировку, и подписки
+        # параллельного запроса не вклиниваются между чтением и INSERT.
+        UserCounter.objects.filter(user_id=user.pk).update(
+            following_count=F('following_count'))
+        existing = set(Follow.objects.filter(
+            user=user, author__in=candidates,
+        ).values_list('author_id', flat=True))
+        new = [
+            author for author in dict.fromkeys(candidates)
+            if author.pk not in existing
+        ]
+        Follow.objects.bulk_create(
+            [Follow(user=user, author=author) for author in new],
+            ignore_conflicts=True,
+        )
+        if new:
+            counters.refresh_users([user.pk, *(author.pk for author in new)])
+            for author in new:
+                timeline.followers_changed(author.pk)
+                timeline.backfill(user.pk, author.pk)
+            caching.bump(*{
+                scope for author in new
+                for scope in caching.follow_scopes(user.pk, author.pk)
+            })
+    _forget(user)
+    return new
+
+
+def unfollow_many(user, authors):
+    """Отписывает пользователя от авторов одним DELETE.
+
+    Счётчики и ленты по каждой снятой подписке обновляют сигналы
+    `post_delete`. Возвращает id авторов, подписки на которых были.
+    """
+    with transaction.atomic():
+        follows = Follow.objects.filter(user=user, author__in=authors)
+        removed = list(follows.values_list('author_id', flat=True))
+        follows.delete()
+    _forget(user)
+    return removed
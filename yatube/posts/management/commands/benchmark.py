@@ -0,0 +1,109 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import benchmark
+
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    }
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет отдельную базу синтетическими данными и замеряет '
+        'пропускную способность и p50/p99 горячих view.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Подписок на пользователя.')
+        parser.add_argument(
+            '--comments', type=int, default=3,
+            help='Комментариев на пост в среднем.')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--scenarios', nargs='+', choices=benchmark.SCENARIOS,
+            default=benchmark.SCENARIOS)
+        parser.add_argument(
+            '--cold-cache', action='store_true',
+            help='Очищать кеш перед каждым запросом.')
+        parser.add_argument(
+            '--in-place', action='store_true',
+            help='Работать с текущей базой, а не с отдельной тестовой.')
+        parser.add_argument(
+            '--no-seed', action='store_true',
+            help='Не наполнять базу (вместе с --in-place).')
+        parser.add_argument(
+            '--output', help='Файл для результатов в JSON.')
+        parser.add_argument(
+            '--baseline', help='JSON прошлого прогона для сравнения.')
+        parser.add_argument(
+            '--threshold', type=float, default=10,
+            help='Допустимый рост p50 относительно baseline, %%.')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        old_name = None
+        if not options['in_place']:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True)
+        try:
+            with override_settings(CACHES=BENCHMARK_CACHES):
+                results = self.benchmark(options, verbosity)
+        finally:
+            if old_name is not None:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for scenario, result in results['results'].items():
+            self.stdout.write(
+                f'{scenario:>14}: {result["throughput_rps"]:>8} rps, '
+                f'p50 {result["p50_ms"]} ms, p99 {result["p99_ms"]} ms, '
+                f'{result["queries_per_request"]} SQL/запрос'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as baseline:
+                regressions = benchmark.compare(
+                    results, json.load(baseline), options['threshold'])
+            if regressions:
+                raise CommandError('Регрессия p50: ' + ', '.join(
+                    f'{scenario} +{change}%'
+                    for scenario, change in regressions))
+
+    def benchmark(self, options, verbosity):
+        def report(message):
+            if verbosity > 1:
+                self.stdout.write(message)
+
+        if not options['no_seed']:
+            benchmark.seed(
+                users=options['users'],
+                groups=options['groups'],
+                posts=options['posts'],
+                follows=options['follows'],
+                comments=options['comments'],
+                seed_value=options['seed'],
+                report=report,
+            )
+        return benchmark.run(
+            scenarios=options['scenarios'],
+            requests=options['requests'],
+            warmup=options['warmup'],
+            cold_cache=options['cold_cache'],
+            seed_value=options['seed'],
+        )
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.tasks import generate_thumbnail
+from posts.thumbnails import generate
+
+CHUNK_SIZE = 100
+
+
+class Command(BaseCommand):
+    help = 'Создаёт превью для картинок постов, у которых их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать превью для всех постов с картинками.',
+        )
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help='Поставить задачи в очередь вместо создания на месте.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(thumbnail='')
+        posts = posts.order_by('pk').values_list('pk', flat=True)
+        done = failed = 0
+        last_pk = 0
+        while True:
+            # Курсор не держится открытым, пока пишем в базу.
+            chunk = list(posts.filter(pk__gt=last_pk)[:CHUNK_SIZE])
+            if not chunk:
+                break
+            last_pk = chunk[-1]
+            for post_id in chunk:
+                if options['enqueue']:
+                    generate_thumbnail.delay(post_id)
+                    done += 1
+                elif self._generate(post_id):
+                    done += 1
+                else:
+                    failed += 1
+            self.stdout.write(f'Обработано: {done + failed}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Превью созданы или поставлены в очередь: {done}, '
+            f'ошибок: {failed}.'))
+
+    def _generate(self, post_id):
+        try:
+            return generate(post_id) is not None
+        except Exception as error:
+            self.stderr.write(f'Пост {post_id}: {error}')
+            return False
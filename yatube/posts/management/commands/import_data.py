@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import importing
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает пользователей, группы, посты, комментарии и подписки '
+        'из JSONL или CSV (можно .gz или stdin) пачками bulk_create.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=importing.KINDS)
+        parser.add_argument('path', help='Файл или "-" для stdin.')
+        parser.add_argument(
+            '--format', choices=importing.FORMATS,
+            help='По умолчанию определяется по расширению файла.')
+        parser.add_argument(
+            '--batch-size', type=int, default=importing.BATCH_SIZE)
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс '
+                 '(например, между загрузками нескольких файлов).')
+
+    def handle(self, *args, **options):
+        def report(message):
+            if options['verbosity'] > 1:
+                self.stdout.write(message)
+
+        path = options['path']
+        fmt = options['format'] or importing.guess_format(path)
+        try:
+            with importing.open_source(path) as stream:
+                read, inserted = importing.load(
+                    options['kind'],
+                    importing.read_records(stream, fmt),
+                    batch_size=options['batch_size'],
+                    report=report,
+                )
+        except (OSError, KeyError, ValueError) as error:
+            raise CommandError(f'Ошибка загрузки: {error!r}')
+        if not options['no_rebuild']:
+            report('Пересчёт счётчиков, лент и поискового индекса')
+            importing.rebuild_derived()
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {read}, отправлено в базу {inserted}, '
+            f'пропущено {read - inserted}.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации подписок и ставит их '
+            'периодический пересчёт в очередь задач.')
+
+    def handle(self, *args, **options):
+        saved = suggestions.refresh()
+        suggestions.schedule()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендаций сохранено: {saved}.'))
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.28 on 2026-10-18 17:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0019_pulledauthor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingPost',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='posts.Post')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Пост до раскладки по лентам',
+                'verbose_name_plural': 'Посты до раскладки по лентам',
+            },
+        ),
+    ]
@@ -35,9 +35,33 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    thumbnail = models.ImageField(
+        'Превью',
+        upload_to='posts/thumbs/',
+        blank=True,
+        editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ['-pub_date']
+        # Возрастающие индексы SQLite читает в обратном порядке, и они
+        # покрывают и ORDER BY pub_date DESC, и keyset (pub_date, id).
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', 'pub_date'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -81,6 +105,15 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx',
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -95,3 +128,148 @@ class Follow(models.Model):
         related_name='following',
         null=True,
     )
+
+    class Meta:
+        unique_together = ('user', 'author')
+        constraints = [
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='follow_not_self',
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации поста (fan-out on write), поэтому лента
+    «Избранные авторы» читается диапазоном по индексу (user, -pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class PulledAuthor(models.Model):
+    """Автор, чьи посты не раскладываются по лентам, а подтягиваются при
+    чтении (см. `posts.timeline`).
+
+    Отметка ставится, когда подписчиков становится больше
+    `TIMELINE_FANOUT_LIMIT`, и снимается только после того, как посты
+    автора разложены по лентам всех подписчиков.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+    )
+    since = models.DateTimeField('С какого момента', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Автор без раскладки по лентам'
+        verbose_name_plural = 'Авторы без раскладки по лентам'
+
+
+class PendingPost(models.Model):
+    """Новый пост, который фоновая задача ещё не разложила по лентам.
+
+    Пока строка есть, лента подписок подтягивает пост при чтении, как
+    посты `PulledAuthor` (см. `posts.timeline`).
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+
+    class Meta:
+        verbose_name = 'Пост до раскладки по лентам'
+        verbose_name_plural = 'Посты до раскладки по лентам'
+
+
+class UserCounter(models.Model):
+    """Денормализованные счётчики пользователя.
+
+    Поддерживаются сигналами при создании и удалении `Post` и `Follow`,
+    пересчитываются командой `manage.py recount_counters`.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class FollowSuggestion(models.Model):
+    """Рекомендация «на кого подписаться»: автор, на которого подписаны
+    авторы, читаемые пользователем.
+
+    Пересчитывается периодически (`posts.suggestions.refresh`), а не
+    обходом графа подписок в каждом запросе.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    score = models.PositiveIntegerField('Общих подписок')
+
+    class Meta:
+        ordering = ('-score', 'author')
+        unique_together = ('user', 'author')
+        indexes = [
+            models.Index(
+                fields=['user', '-score'],
+                name='suggestion_user_score_idx',
+            ),
+        ]
+        verbose_name = 'Рекомендация подписки'
+        verbose_name_plural = 'Рекомендации подписок'
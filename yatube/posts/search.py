@@ -0,0 +1,156 @@
+"""Полнотекстовый поиск по постам.
+
+Бэкенд выбирается настройкой `SEARCH_BACKEND`. По умолчанию это
+виртуальная таблица SQLite FTS5 `posts_post_fts`: сохранённый пост
+индексирует фоновая задача `posts.tasks.index_post`, удалённый убирает
+сигнал, а результаты ранжируются
+по bm25. `LikeSearchBackend` подходит для баз без FTS5.
+"""
+import re
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import connection
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+TOKEN_RE = re.compile(r'\w+')
+
+
+class SearchBackend(ABC):
+    """Интерфейс бэкенда поиска."""
+
+    @abstractmethod
+    def index(self, post):
+        """Добавляет пост в индекс или обновляет его."""
+
+    @abstractmethod
+    def remove(self, post_id):
+        """Удаляет пост из индекса."""
+
+    @abstractmethod
+    def rebuild(self):
+        """Строит индекс заново по всем постам."""
+
+    @abstractmethod
+    def count(self, query):
+        """Число постов, подходящих под запрос."""
+
+    @abstractmethod
+    def search(self, query, offset, limit):
+        """Список id постов по убыванию релевантности."""
+
+
+class SQLiteFTSBackend(SearchBackend):
+    @staticmethod
+    def match_expression(query):
+        # Каждое слово — отдельная фраза: пользовательский ввод
+        # не может сломать синтаксис запроса FTS5.
+        return ' '.join(
+            f'"{token}"' for token in TOKEN_RE.findall(query.lower()))
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+                [post.pk, post.text],
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text) '
+                f'SELECT id, text FROM {Post._meta.db_table}'
+            )
+
+    def count(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                [self.match_expression(query)],
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, query, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                'ORDER BY rank LIMIT %s OFFSET %s',
+                [self.match_expression(query), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class LikeSearchBackend(SearchBackend):
+    """Поиск `LIKE '%слово%'` без индекса, для баз без FTS5."""
+
+    def index(self, post):
+        pass
+
+    def remove(self, post_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def queryset(self, query):
+        posts = Post.objects.all()
+        for token in TOKEN_RE.findall(query):
+            posts = posts.filter(text__icontains=token)
+        return posts
+
+    def count(self, query):
+        return self.queryset(query).count()
+
+    def search(self, query, offset, limit):
+        return list(self.queryset(query).values_list(
+            'pk', flat=True)[offset:offset + limit])
+
+
+def get_backend():
+    return import_string(settings.SEARCH_BACKEND)()
+
+
+class SearchResults:
+    """Ленивая выдача поиска для `Paginator`: считает и режет на стороне
+    бэкенда, посты загружает одним запросом на страницу."""
+
+    def __init__(self, query, backend=None):
+        self.query = query
+        self.backend = backend or get_backend()
+
+    @cached_property
+    def total(self):
+        if not TOKEN_RE.search(self.query):
+            return 0
+        return self.backend.count(self.query)
+
+    def count(self):
+        return self.total
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        stop = self.total if index.stop is None else index.stop
+        if stop <= start or not self.total:
+            return []
+        ids = self.backend.search(self.query, start, stop - start)
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,96 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import caching, counters, search, timeline
+from .models import Comment, Follow, Group, Post, User
+from .tasks import index_post, publish_post
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    """Запоминает прежнюю группу, чтобы сбросить и её кеш."""
+    if instance.pk and not instance._state.adding:
+        instance._previous_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_published(sender, instance, created, **kwargs):
+    """В запросе сбрасываются только версии кеша.
+
+    Счётчик автора, ленты подписчиков (до `TIMELINE_FANOUT_LIMIT`
+    вставок) и поисковый индекс обновляют фоновые задачи. До раскладки
+    подписчики читают пост по отметке `PendingPost` (`timeline.publish`).
+    """
+    scopes = caching.post_scopes(instance.author_id, instance.group_id)
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id:
+        scopes.append(f'group:{previous_group_id}')
+    caching.bump(*scopes)
+    index_post.delay(instance.pk)
+    if created:
+        timeline.publish(instance)
+        publish_post.delay(instance.pk, instance.author_id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    caching.bump(
+        *caching.post_scopes(instance.author_id, instance.group_id))
+    counters.bump_user(instance.author_id, posts_count=-1)
+    search.get_backend().remove(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.bump(caching.META_SCOPE)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, created=False, update_fields=None,
+                 **kwargs):
+    """Имена авторов видны во всех лентах.
+
+    Регистрация и вход в систему (обновление `last_login`) ленты не
+    меняют.
+    """
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    caching.bump(caching.META_SCOPE)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+    caching.bump(*caching.comment_scopes(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    caching.bump(*caching.comment_scopes(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created and instance.user_id and instance.author_id:
+        counters.bump_user(instance.user_id, following_count=1)
+        counters.bump_user(instance.author_id, followers_count=1)
+        timeline.followers_changed(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+        caching.bump(
+            *caching.follow_scopes(instance.user_id, instance.author_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if instance.user_id and instance.author_id:
+        counters.bump_user(instance.user_id, following_count=-1)
+        counters.bump_user(instance.author_id, followers_count=-1)
+        timeline.followers_changed(instance.author_id)
+        timeline.drop(instance.user_id, instance.author_id)
+        caching.bump(
+            *caching.follow_scopes(instance.user_id, instance.author_id))
@@ -0,0 +1,97 @@
+"""Рекомендации «на кого подписаться» по друзьям друзей.
+
+Кандидаты пользователя — авторы, на которых подписаны авторы, читаемые
+им самим; вес кандидата — число таких общих подписок. Обход графа
+выполняется не в запросе, а в фоновой задаче `refresh_suggestions` раз в
+`SUGGESTIONS_REFRESH_INTERVAL` секунд: пользователи обрабатываются
+пачками, на пачку — один агрегирующий запрос по `Follow`, а результат
+хранится в `FollowSuggestion`. Запрос рекомендаций — чтение
+`SUGGESTIONS_PER_USER` строк по индексу.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from taskqueue.queue import enqueue_once
+from . import follows
+from .models import Follow, FollowSuggestion
+
+REFRESH_TASK = 'posts.tasks.refresh_suggestions'
+BATCH_SIZE = 500
+
+
+def _compute(user_ids):
+    """Лучшие кандидаты пачки пользователей: {user_id: [(author_id, вес)]}.
+    """
+    user_follows = Follow.objects.filter(user_id__in=user_ids)
+    followed = defaultdict(set)
+    for user_id, author_id in user_follows.values_list('user_id', 'author_id'):
+        followed[user_id].add(author_id)
+    pairs = user_follows.filter(
+        author__follower__author__isnull=False,
+    ).values(
+        'user_id', candidate=F('author__follower__author'),
+    ).annotate(score=Count('pk')).order_by()
+    candidates = defaultdict(list)
+    for row in pairs:
+        user_id, candidate = row['user_id'], row['candidate']
+        if candidate != user_id and candidate not in followed[user_id]:
+            candidates[user_id].append((candidate, row['score']))
+    return {
+        user_id: sorted(
+            found, key=lambda item: (-item[1], item[0])
+        )[:settings.SUGGESTIONS_PER_USER]
+        for user_id, found in candidates.items()
+    }
+
+
+def refresh(batch_size=BATCH_SIZE):
+    """Пересчитывает рекомендации всех пользователей.
+
+    Возвращает число сохранённых рекомендаций.
+    """
+    users = Follow.objects.filter(user__isnull=False).order_by(
+        'user_id').values_list('user_id', flat=True).distinct()
+    FollowSuggestion.objects.exclude(user__in=users).delete()
+    saved = 0
+    last_id = 0
+    while True:
+        chunk = list(users.filter(user_id__gt=last_id)[:batch_size])
+        if not chunk:
+            return saved
+        last_id = chunk[-1]
+        suggestions = [
+            FollowSuggestion(user_id=user_id, author_id=author_id,
+                             score=score)
+            for user_id, found in _compute(chunk).items()
+            for author_id, score in found
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=chunk).delete()
+            FollowSuggestion.objects.bulk_create(suggestions)
+        saved += len(suggestions)
+
+
+def schedule():
+    """Планирует следующий пересчёт, если он ещё не в очереди."""
+    enqueue_once(
+        REFRESH_TASK,
+        timezone.now() + timedelta(
+            seconds=settings.SUGGESTIONS_REFRESH_INTERVAL),
+    )
+
+
+def for_user(user, limit=None):
+    """Готовые рекомендации без авторов, на которых пользователь уже
+    подписался после пересчёта."""
+    followed = follows.following_ids(user)
+    suggestions = user.follow_suggestions.select_related('author')[
+        :settings.SUGGESTIONS_PER_USER]
+    return [
+        suggestion for suggestion in suggestions
+        if suggestion.author_id not in followed
+    ][:limit]
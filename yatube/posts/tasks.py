@@ -0,0 +1,51 @@
+"""Фоновые задачи приложения posts (см. `taskqueue.queue`)."""
+from django.db import transaction
+
+from taskqueue.queue import task
+from . import caching, counters, search, suggestions, thumbnails, timeline
+from .models import Post
+
+
+@task
+def publish_post(post_id, author_id):
+    """Счётчик постов автора и ленты подписчиков для нового поста.
+
+    Счётчик пересчитывается, а не увеличивается: задача может
+    повториться или выполниться уже после удаления поста.
+    """
+    post = Post.objects.filter(pk=post_id).first()
+    with transaction.atomic():
+        counters.recount_posts(author_id)
+        if post is not None:
+            timeline.fan_out(post)
+    caching.bump(f'profile:{author_id}')
+
+
+@task
+def index_post(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        search.get_backend().index(post)
+
+
+@task
+def generate_thumbnail(post_id):
+    thumbnails.generate(post_id)
+
+
+@task
+def refresh_suggestions():
+    """Пересчитывает рекомендации подписок и планирует следующий раз.
+
+    Следующий запуск ставится и при ошибке пересчёта, иначе цепочка
+    периодических задач оборвалась бы навсегда.
+    """
+    try:
+        suggestions.refresh()
+    finally:
+        suggestions.schedule()
+
+
+@task
+def materialize_timeline(author_id):
+    timeline.materialize(author_id)
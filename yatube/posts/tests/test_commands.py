@@ -0,0 +1,202 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import benchmark, importing
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_benchmark_writes_results(self):
+        """Прогон на крошечном наборе данных пишет JSON по всем view."""
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'bench.json')
+            call_command(
+                'benchmark', '--in-place',
+                users=5, groups=2, posts=20, follows=2, comments=1,
+                requests=2, warmup=0, output=output, stdout=StringIO(),
+            )
+            with open(output, encoding='utf-8') as results_file:
+                results = json.load(results_file)
+        self.assertEqual(results['dataset']['posts'], 20)
+        self.assertEqual(
+            set(results['results']), set(benchmark.SCENARIOS))
+        for result in results['results'].values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_compare_reports_regressions(self):
+        baseline = {'results': {'index': {'p50_ms': 10.0}}}
+        current = {'results': {
+            'index': {'p50_ms': 12.0}, 'profile': {'p50_ms': 5.0}}}
+        self.assertEqual(
+            benchmark.compare(current, baseline, threshold=10),
+            [('index', 20.0)]
+        )
+
+
+class ImportDataCommandTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf-8') as source:
+            source.write(content)
+        return path
+
+    def load(self, kind, content, name):
+        out = StringIO()
+        call_command('import_data', kind, self.write(name, content),
+                     batch_size=2, stdout=out)
+        return out.getvalue()
+
+    def test_import_all_kinds(self):
+        """Загрузка всех видов записей сохраняет даты из файла и
+        пересчитывает производные данные."""
+        users = ''.join(
+            json.dumps({'username': name}) + '\n'
+            for name in ('reader', 'writer', 'other')
+        )
+        self.load('users', users, 'users.jsonl')
+        self.load('groups', 'slug,title,description\nimp,Импорт,\n',
+                  'groups.csv')
+        self.load('follows', 'user,author\nreader,writer\n', 'follows.csv')
+        posts = '\n'.join(json.dumps(record) for record in (
+            {'id': 500, 'author': 'writer', 'group': 'imp', 'text': 'Раз',
+             'pub_date': '2020-01-02T03:04:05'},
+            {'author': 'writer', 'text': 'Два',
+             'pub_date': '2019-05-06T07:08:09'},
+            {'author': 'writer', 'text': 'Три'},
+            {'author': 'ghost', 'text': 'Без автора'},
+        ))
+        output = self.load('posts', posts, 'posts.jsonl')
+        self.assertIn('пропущено 1', output)
+        self.load('comments', 'post,author,text,created\n'
+                  '500,reader,Коммент,2021-01-01T00:00:00\n', 'comments.csv')
+
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(
+            Post.objects.get(text='Два').pub_date.isoformat(),
+            '2019-05-06T07:08:09+00:00')
+        self.assertEqual(
+            Post.objects.get(text='Три').pub_date.date(),
+            timezone.now().date())
+        self.assertEqual(Comment.objects.get().created.year, 2021)
+        self.assertEqual(post.group.slug, 'imp')
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(post.comments_count, 1)
+        writer = User.objects.get(username='writer')
+        self.assertEqual(writer.counters.followers_count, 1)
+        self.assertEqual(writer.counters.posts_count, 3)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user__username='reader').count(), 3)
+        self.assertFalse(writer.has_usable_password())
+
+    def test_reimport_does_not_duplicate(self):
+        users = '{"username": "twice"}\n'
+        self.load('users', users, 'users.jsonl')
+        self.load('users', users, 'users.jsonl')
+        self.assertEqual(User.objects.filter(username='twice').count(), 1)
+
+    def test_reimport_keeps_dates_of_existing_posts(self):
+        """Дата из файла достаётся только вставленной строке, а
+        `auto_now_add` модели во время загрузки не отключается."""
+        self.load('users', '{"username": "writer"}\n', 'users.jsonl')
+        self.load('posts', json.dumps(
+            {'id': 7, 'author': 'writer', 'text': 'Пост',
+             'pub_date': '2020-01-01T00:00:00'}), 'first.jsonl')
+        field = Post._meta.get_field('pub_date')
+        seen = []
+        records = [
+            {'id': 7, 'author': 'writer', 'text': 'Пост',
+             'pub_date': '2010-01-01T00:00:00'},
+        ]
+        importing.load('posts', records,
+                       report=lambda line: seen.append(field.auto_now_add))
+        self.assertEqual(seen, [True])
+        self.assertEqual(Post.objects.get(pk=7).pub_date.year, 2020)
+
+    def test_invalid_file_raises_command_error(self):
+        with self.assertRaises(CommandError):
+            self.load('users', '{"username": \n', 'broken.jsonl')
+
+
+class ExportDataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='exported')
+        cls.reader = User.objects.create_user(username='exporter')
+        cls.group = Group.objects.create(title='Экспорт', slug='export')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост, {index}')
+            for index in range(3)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Коммент')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'dump')
+            call_command('export_data', *args, output=output)
+            with open(output, 'rb') as dump:
+                return dump.read()
+
+    def test_export_jsonl_round_trips_through_import(self):
+        """Выгрузка постов загружается обратно командой import_data."""
+        dump = self.export('posts', '--chunk-size', '2')
+        records = [json.loads(line) for line in dump.decode().splitlines()]
+        self.assertEqual([r['id'] for r in records],
+                         [post.pk for post in self.posts])
+        self.assertEqual(records[0]['author'], 'exported')
+        self.assertEqual(records[0]['group'], 'export')
+
+        Post.objects.all().delete()
+        with tempfile.NamedTemporaryFile(suffix='.jsonl') as source:
+            source.write(dump)
+            source.flush()
+            call_command('import_data', 'posts', source.name,
+                         stdout=StringIO())
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('pk', 'text')),
+            [(post.pk, post.text) for post in self.posts]
+        )
+
+    def test_export_csv_gzip(self):
+        dump = self.export('follows', '--format', 'csv', '--gzip')
+        self.assertEqual(
+            gzip.decompress(dump).decode().splitlines(),
+            ['user,author', 'exporter,exported']
+        )
+
+    def test_admin_export_streams_for_superuser(self):
+        url = reverse('admin:posts_export', kwargs={'kind': 'comments'})
+        client = Client()
+        client.force_login(User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='x'))
+        response = client.get(url, {'format': 'csv', 'gzip': '1'})
+        self.assertTrue(response.streaming)
+        self.assertIn('comments.csv.gz', response['Content-Disposition'])
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertIn('Коммент', content.decode())
+
+    def test_admin_export_forbidden_for_others(self):
+        url = reverse('admin:posts_export', kwargs={'kind': 'posts'})
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        client = Client()
+        self.assertEqual(client.get(url).status_code, 302)
+        client.force_login(staff)
+        self.assertEqual(client.get(url).status_code, 404)
@@ -1,17 +1,29 @@
+import os
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import StringIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from ..forms import CommentForm
 from ..models import Group, Post, Comment
+from ..thumbnails import THUMBNAIL_SIZE, thumbnail_name
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
 
 User = get_user_model()
 
@@ -51,16 +63,9 @@ class PostFormTests(TestCase):
     def test_create_post(self):
         """При отправке валидной формы создаётся новая запись."""
         posts_count = Post.objects.count()
-        small_gif = (
-            b'\x47\x49\x46\x38\x39\x61\x01\x00'
-            b'\x01\x00\x00\x00\x00\x21\xf9\x04'
-            b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
-            b'\x00\x00\x01\x00\x01\x00\x00\x02'
-            b'\x02\x4c\x01\x00\x3b'
-        )
         uploaded = SimpleUploadedFile(
             name='small.gif',
-            content=small_gif,
+            content=SMALL_GIF,
             content_type='image/gif'
         )
         form_data = {
@@ -86,6 +91,76 @@ class PostFormTests(TestCase):
         self.assertEqual(post.group.id, form_data['group'])
         self.assertEqual(post.image, f'posts/{form_data["image"]}')
 
+    @override_settings(TASKS_EAGER=True)
+    def test_create_post_generates_thumbnail(self):
+        """Превью создаётся при загрузке под предсказуемым именем."""
+        uploaded = SimpleUploadedFile(
+            name='thumb.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        self.authorized_author.post(
+            reverse('posts:post_create'),
+            data={'text': 'С картинкой', 'image': uploaded},
+        )
+        post = Post.objects.latest('id')
+        self.assertEqual(
+            post.thumbnail.name,
+            f'posts/thumbs/{post.pk}_thumb.gif_960x339.jpg',
+        )
+        with Image.open(post.thumbnail.path) as image:
+            self.assertEqual(image.size, THUMBNAIL_SIZE)
+
+    def test_generate_thumbnails_command(self):
+        post = Post.objects.create(
+            author=self.author,
+            text='Старый пост',
+            image=SimpleUploadedFile('old.gif', SMALL_GIF, 'image/gif'),
+        )
+        call_command('generate_thumbnails', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(
+            post.thumbnail.name, thumbnail_name(post.pk, post.image.name))
+
+    def test_thumbnail_names_do_not_collide(self):
+        """Картинки с одинаковым именем без расширения получают разные
+        превью."""
+        self.assertNotEqual(
+            thumbnail_name(1, 'posts/cat.png'),
+            thumbnail_name(1, 'posts/cat.gif'),
+        )
+        self.assertNotEqual(
+            thumbnail_name(1, 'posts/cat.png'),
+            thumbnail_name(2, 'posts/cat.png'),
+        )
+
+    @override_settings(TASKS_EAGER=True)
+    def test_new_image_replaces_only_own_thumbnail(self):
+        other = Post.objects.create(
+            author=self.author,
+            text='Чужой пост',
+            image=SimpleUploadedFile('cat.gif', SMALL_GIF, 'image/gif'),
+        )
+        call_command('generate_thumbnails', stdout=StringIO())
+        other.refresh_from_db()
+        self.authorized_author.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост', 'image': SimpleUploadedFile(
+                'cat.png', SMALL_GIF, 'image/png')},
+        )
+        post = Post.objects.latest('id')
+        old_thumbnail = post.thumbnail.path
+        self.authorized_author.post(
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            data={'text': 'Пост', 'image': SimpleUploadedFile(
+                'dog.gif', SMALL_GIF, 'image/gif')},
+        )
+        post.refresh_from_db()
+        self.assertNotEqual(post.thumbnail.path, old_thumbnail)
+        self.assertFalse(os.path.exists(old_thumbnail))
+        self.assertTrue(os.path.exists(post.thumbnail.path))
+        self.assertTrue(os.path.exists(other.thumbnail.path))
+
     def test_edit_post(self):
         """При отправке валидной формы происходит изменение поста."""
         form_data = {
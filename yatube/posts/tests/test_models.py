@@ -1,7 +1,13 @@
+from io import StringIO
+from unittest import skipUnless
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
 
-from ..models import Group, Post
+from ..models import Comment, Follow, Group, Post, UserCounter
+from ..timeline import timeline_posts
 
 User = get_user_model()
 
@@ -58,3 +64,112 @@ class PostModelTest(TestCase):
             with self.subTest(value=value):
                 self.assertEqual(
                     post._meta.get_field(value).help_text, expected)
+
+
+@override_settings(TASKS_EAGER=True)
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='user')
+        cls.post = Post.objects.create(author=cls.author, text='test-text')
+
+    def assert_counters(self, user, posts, followers, following):
+        counters = UserCounter.objects.get(user=user)
+        self.assertEqual(
+            (counters.posts_count,
+             counters.followers_count,
+             counters.following_count),
+            (posts, followers, following),
+        )
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        self.assert_counters(self.author, 1, 0, 0)
+        Post.objects.create(author=self.author, text='second')
+        Follow.objects.create(user=self.user, author=self.author)
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='comment')
+        self.assert_counters(self.author, 2, 1, 0)
+        self.assert_counters(self.user, 0, 0, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+        comment.delete()
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        Post.objects.filter(text='second').delete()
+        self.assert_counters(self.author, 1, 0, 0)
+        self.assert_counters(self.user, 0, 0, 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_recount_counters_command(self):
+        """Команда recount_counters восстанавливает испорченные счётчики."""
+        Comment.objects.create(post=self.post, author=self.user, text='c')
+        UserCounter.objects.update(posts_count=42)
+        Post.objects.update(comments_count=0)
+        call_command('recount_counters', stdout=StringIO())
+        self.assert_counters(self.author, 1, 0, 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+
+class FollowConstraintTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='follower')
+        cls.author = User.objects.create_user(username='followed')
+
+    def test_duplicate_follow_rejected_by_database(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.author)
+
+    def test_self_follow_rejected_by_database(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.user, author=self.user)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class FeedQueryPlanTest(TestCase):
+    """Запросы лент читают индекс, а не сортируют таблицу целиком."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='test-group',
+            slug='test-slug',
+            description='test-description',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, text='test-text', group=cls.group)
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' | '.join(str(row[-1]) for row in cursor.fetchall())
+
+    def test_feed_queries_use_indexes(self):
+        querysets = {
+            'index': Post.objects.select_related('author', 'group'),
+            'index cursor': Post.objects.order_by('-pub_date', '-pk'),
+            'group_posts': self.group.posts.select_related('author'),
+            'profile': self.user.posts.all(),
+            'post_detail comments': self.post.comments.all(),
+            'follow_index': timeline_posts(self.user),
+        }
+        for name, queryset in querysets.items():
+            with self.subTest(query=name):
+                plan = self.explain(queryset[:10])
+                self.assertIn('USING', plan)
+                self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_cursor_query_is_fully_covered_by_index(self):
+        plan = self.explain(
+            self.user.posts.order_by('-pub_date', '-pk')[:10])
+        self.assertIn('post_author_pub_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
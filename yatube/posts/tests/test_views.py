@@ -1,11 +1,20 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
 from django import forms
 from django.core.cache import cache
-from django.test import Client, TestCase
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from .. import follows, timeline
 from ..forms import PostForm
-from ..models import Post, Group, Comment, Follow
+from ..models import (
+    Comment, Follow, Group, Post, PulledAuthor, TimelineEntry,
+)
+from taskqueue.models import Task
+from taskqueue.worker import Worker
 from yatube.settings import NUM_OF_POST
 
 User = get_user_model()
@@ -34,6 +43,9 @@ class PostPagesTests(TestCase):
         )
 
     def setUp(self):
+        # Анонимные страницы кешируются целиком, а кеш между тестами
+        # не откатывается вместе с базой.
+        cache.clear()
         self.authorized_author = Client()
         self.authorized_author.force_login(self.author)
         self.authorized_client = Client()
@@ -135,11 +147,42 @@ class PostPagesTests(TestCase):
         cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
         cache_check = response.content
-        post = Post.objects.get(pk=self.post.pk)
-        post.delete()
+        # update() не вызывает сигналов: фрагмент остаётся в кеше.
+        Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, cache_check)
 
+    def test_cache_is_invalidated_on_post_changes(self):
+        """Изменение и удаление поста сбрасывает кеш лент."""
+        cache.clear()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+        )
+        for url in urls:
+            self.client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Отредактированный текст'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, post.text)
+        post.delete()
+        for url in urls[:1]:
+            response = self.client.get(url)
+            self.assertNotContains(response, post.text)
+
+    def test_cache_is_invalidated_on_group_rename(self):
+        cache.clear()
+        self.client.get(reverse('posts:index'))
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'new-slug'
+        group.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '/group/new-slug/')
+
     def test_auth_user_follow(self):
         """Авторизованный пользователь может подписываться на других
         пользователей."""
@@ -228,3 +271,514 @@ class PaginatorViewsTest(TestCase):
         )
         second_page = Post.objects.count() % NUM_OF_POST
         self.assertEqual(len(response.context['page_obj']), second_page)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='test-title',
+            slug='test-slug',
+            description='test-description',
+        )
+        for post_index in range(1, 14):
+            Post.objects.create(
+                author=cls.user,
+                text=f'Какой-то текст № {post_index}',
+                group=cls.group,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_cover_feed_without_gaps(self):
+        """Курсоры проходят ленту целиком в порядке (pub_date, id)."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        for url in urls:
+            with self.subTest(url=url):
+                first = self.client.get(url + '?cursor=').context['page_obj']
+                self.assertEqual(len(first), NUM_OF_POST)
+                self.assertFalse(first.has_previous())
+                second = self.client.get(
+                    url, {'cursor': first.next_cursor}).context['page_obj']
+                self.assertFalse(second.has_next())
+                self.assertEqual(list(first) + list(second), expected)
+
+                back = self.client.get(
+                    url, {'cursor': second.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_cursor_page_does_not_count(self):
+        """Keyset-страница не выполняет COUNT(*)."""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('posts:index') + '?cursor=')
+        self.assertTrue(response.context['page_obj'].has_next())
+
+    def test_invalid_cursor_returns_first_page(self):
+        response = self.client.get(reverse('posts:index') + '?cursor=xyz')
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(Post.objects.order_by('-pub_date', '-pk')[:NUM_OF_POST])
+        )
+
+
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get_feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    @override_settings(TASKS_EAGER=False)
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост раскладывает по лентам подписчиков фоновая задача,
+        а не запрос, создавший пост."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.get_feed(), [])
+        author_client = Client()
+        author_client.force_login(self.author)
+        author_client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост'})
+        post = Post.objects.get(text='Новый пост')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertTrue(
+            Task.objects.filter(name='posts.tasks.publish_post').exists())
+
+        Worker(threads=1).run(once=True)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists())
+        self.assertEqual(self.author.counters.posts_count, 1)
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_follow_backfills_and_unfollow_drops_timeline(self):
+        """Подписка переносит старые посты в ленту, отписка убирает их."""
+        post = Post.objects.create(author=self.author, text='Старый пост')
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertEqual(self.get_feed(), [post])
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.get_feed(), [])
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_pulled_on_read(self):
+        """Посты популярных авторов не раскладываются, а читаются
+        напрямую."""
+        Follow.objects.create(user=self.user, author=self.star)
+        cache.clear()
+        post = Post.objects.create(author=self.star, text='Пост звезды')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        with mock.patch.object(
+                timeline, 'celebrities', wraps=timeline.celebrities) as read:
+            self.assertEqual(list(timeline.timeline_posts(self.user)), [post])
+        read.assert_called_once_with()
+        self.assertEqual(self.get_feed(), [post])
+
+    def test_fan_out_does_not_aggregate_follows(self):
+        """Публикация на холодном кеше не считает подписчиков всех
+        авторов."""
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.create(author=self.author, text='Первый пост')
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.create(author=self.author, text='Второй пост')
+        self.assertFalse([
+            query for query in queries
+            if 'GROUP BY' in query['sql'] and 'posts_follow' in query['sql']
+        ])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, TASKS_EAGER=False)
+    def test_posts_stay_pulled_until_materialized(self):
+        """Посты периода популярности не пропадают, когда подписчиков
+        снова становится меньше порога, и раскладываются задачей."""
+        Follow.objects.create(user=self.user, author=self.star)
+        Follow.objects.create(user=self.author, author=self.star)
+        post = Post.objects.create(author=self.star, text='Пост звезды')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+
+        Follow.objects.get(user=self.author, author=self.star).delete()
+        self.assertEqual(self.get_feed(), [post])
+        self.assertTrue(
+            Task.objects.filter(name='posts.tasks.materialize_timeline')
+            .exists())
+        Worker(threads=1).run(once=True)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists())
+        self.assertFalse(PulledAuthor.objects.exists())
+        self.assertEqual(self.get_feed(), [post])
+
+        newer = Post.objects.create(author=self.star, text='Новый пост')
+        Worker(threads=1).run(once=True)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=newer).exists())
+
+
+class FollowGraphTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'writer{index}')
+            for index in range(3)
+        ]
+        Follow.objects.create(user=cls.user, author=cls.authors[0])
+        cls.posts = [
+            Post.objects.create(author=author, text='Пост')
+            for author in cls.authors
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def fresh_user(self):
+        return User.objects.get(pk=self.user.pk)
+
+    def test_following_set_is_cached(self):
+        follows.following_ids(self.fresh_user())
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(follows.is_following(user, self.authors[0]))
+            self.assertFalse(follows.is_following(user, self.authors[1]))
+
+    def test_follow_and_unfollow_invalidate_cache(self):
+        follows.following_ids(self.fresh_user())
+        self.assertTrue(follows.follow(self.user, self.authors[1]))
+        self.assertIn(
+            self.authors[1].pk, follows.following_ids(self.fresh_user()))
+        self.assertTrue(follows.unfollow(self.user, self.authors[0]))
+        self.assertEqual(
+            follows.following_ids(self.fresh_user()),
+            {self.authors[1].pk},
+        )
+
+    def test_follow_is_idempotent(self):
+        self.assertFalse(follows.follow(self.user, self.authors[0]))
+        self.assertFalse(follows.follow(self.user, self.user))
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+
+    def test_annotate_page_in_one_query(self):
+        with self.assertNumQueries(1):
+            posts = list(follows.annotate_following(
+                Post.objects.order_by('pk'), self.user))
+        self.assertEqual(
+            [post.is_following for post in posts], [True, False, False])
+        authors = follows.annotate_following(
+            User.objects.filter(pk__in=[a.pk for a in self.authors])
+            .order_by('pk'),
+            self.user, author_field='pk',
+        )
+        self.assertEqual(
+            [author.is_following for author in authors],
+            [True, False, False],
+        )
+
+    def test_mark_page_from_cached_set(self):
+        follows.following_ids(self.fresh_user())
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            follows.mark_following(user, self.posts)
+        self.assertEqual(
+            [post.is_following for post in self.posts], [True, False, False])
+
+    def test_profile_follow_view_twice_keeps_one_row(self):
+        client = Client()
+        client.force_login(self.user)
+        url = reverse(
+            'posts:profile_follow', kwargs={'username': self.authors[2]})
+        client.get(url)
+        client.get(url)
+        self.assertEqual(
+            Follow.objects.filter(user=self.user, author=self.authors[2])
+            .count(), 1)
+
+
+@override_settings(TASKS_EAGER=True)
+class QueryBudgetTests(TestCase):
+    """Число запросов страницы не зависит от числа постов и комментариев.
+
+    Задачи выполняются сразу: посты уже разложены по лентам, как после
+    воркера."""
+    # Кеш холодный: в каждый бюджет входит и подсчёт непрочитанных
+    # уведомлений для шапки, а в ленту подписок ещё и чтение множества
+    # авторов с неразложенными постами.
+    BUDGETS = {
+        'posts:index': 5,
+        'posts:group_list': 6,
+        'posts:profile': 7,
+        'posts:post_detail': 5,
+        'posts:follow_index': 7,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.user = User.objects.create_user(username='user')
+        cls.group = Group.objects.create(
+            title='test-title',
+            slug='test-slug',
+            description='test-description',
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост', group=cls.group)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def get_urls(self):
+        return {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', kwargs={'slug': self.group.slug}),
+            'posts:profile': reverse(
+                'posts:profile', kwargs={'username': self.author}),
+            'posts:post_detail': reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.pk}),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def count_queries(self):
+        counts = {}
+        for name, url in self.get_urls().items():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.authorized_client.get(url)
+            counts[name] = len(queries)
+        return counts
+
+    def test_query_count_is_bounded(self):
+        small = self.count_queries()
+        for index in range(NUM_OF_POST):
+            author = User.objects.create_user(username=f'commenter{index}')
+            Comment.objects.create(post=self.post, author=author, text='c')
+            Post.objects.create(
+                author=self.author, text=f'Пост {index}', group=self.group)
+        large = self.count_queries()
+        for name, budget in self.BUDGETS.items():
+            with self.subTest(view=name):
+                self.assertEqual(large[name], small[name])
+                self.assertLessEqual(large[name], budget)
+
+
+@override_settings(NUM_OF_COMMENTS=3)
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'Коммент {index}')
+            for index in range(5)
+        ]
+
+    def test_post_detail_shows_first_batch(self):
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.comments[:3])
+        self.assertContains(response, 'load-more')
+
+    def test_comments_endpoint_returns_next_batch(self):
+        """Фрагмент отдаёт следующую порцию без кнопки в конце."""
+        url = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+        first = self.client.get(url).context['comments']
+        response = self.client.get(url, {'cursor': first.next_cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertEqual(
+            list(response.context['comments']), self.comments[3:])
+        self.assertNotContains(response, 'load-more')
+
+    def test_comments_endpoint_unknown_post(self):
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(TASKS_EAGER=True)
+class SearchViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.cat = Post.objects.create(
+            author=cls.author, text='Кошка спит на диване')
+        cls.cats = Post.objects.create(
+            author=cls.author, text='Кошка, кошка и ещё одна кошка')
+        cls.dog = Post.objects.create(
+            author=cls.author, text='Собака гуляет во дворе')
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return list(response.context['page_obj'])
+
+    def test_search_ranks_matching_posts(self):
+        """Найдены только подходящие посты, более релевантные выше."""
+        self.assertEqual(self.search('КОШКА'), [self.cats, self.cat])
+        self.assertEqual(self.search('собака двор*'), [])
+        self.assertEqual(self.search('собака'), [self.dog])
+
+    def test_search_index_follows_post_changes(self):
+        post = Post.objects.get(pk=self.dog.pk)
+        post.text = 'Теперь здесь попугай'
+        post.save()
+        self.assertEqual(self.search('собака'), [])
+        self.assertEqual(self.search('попугай'), [post])
+        post.delete()
+        self.assertEqual(self.search('попугай'), [])
+
+    def test_search_handles_special_characters(self):
+        for query in ('', '"', 'AND OR NOT', '*'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [])
+
+    def test_search_is_paginated(self):
+        for index in range(NUM_OF_POST):
+            Post.objects.create(author=self.author, text=f'Кошка № {index}')
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кошка', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+        self.assertEqual(response.context['page_obj'].paginator.count,
+                         NUM_OF_POST + 2)
+        self.assertContains(response, '?q=%D0%BA')
+
+    @override_settings(CURSOR_PAGINATION=True)
+    def test_search_ignores_cursor_pagination(self):
+        """Поиск листается по номерам страниц и при keyset-лентах."""
+        response = self.client.get(reverse('posts:search'), {'q': 'кошка'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(response.context['page_obj']), [self.cats, self.cat])
+
+
+class ConditionalFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='etag_author')
+        cls.group = Group.objects.create(title='ETag', slug='etag')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'etag'}),
+            reverse('posts:profile', kwargs={'username': 'etag_author'}),
+        )
+
+    def test_anonymous_feed_is_publicly_cacheable(self):
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(
+                    response['Cache-Control'], 'public, max-age=60')
+                self.assertIn('Cookie', response['Vary'])
+                self.assertTrue(response.has_header('ETag'))
+
+    def test_unchanged_feed_returns_not_modified(self):
+        """Повторный запрос с валидатором получает пустой 304."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag = response['ETag']
+                modified = response['Last-Modified']
+                with self.assertNumQueries(0 if url == '/' else 1):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(
+                    response['Cache-Control'], 'public, max-age=60')
+                response = self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=modified)
+                self.assertEqual(response.status_code, 304)
+
+    def test_edit_changes_validator(self):
+        url = self.urls[2]
+        etag = self.client.get(url)['ETag']
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Исправленный пост')
+
+    def test_authorized_feed_is_private(self):
+        anonymous = self.client.get(self.urls[0])['ETag']
+        response = self.authorized_client.get(self.urls[0])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'], anonymous)
+
+
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='page_author')
+        cls.group = Group.objects.create(title='Страницы', slug='pages')
+        Post.objects.create(author=cls.author, group=cls.group, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'pages'}),
+            reverse('posts:profile', kwargs={'username': 'page_author'}),
+        )
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторная страница не рендерится и не читает посты из базы."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0 if url == '/' else 1):
+                    second = self.client.get(url)
+                self.assertIsNone(second.context)
+                self.assertEqual(second.content, first.content)
+
+    def test_page_cache_keyed_by_query_string(self):
+        self.client.get(self.urls[0])
+        response = self.client.get(self.urls[0], {'page': 2})
+        self.assertIsNotNone(response.context)
+
+    def test_changes_invalidate_cached_pages(self):
+        for url in self.urls:
+            self.client.get(url)
+        Post.objects.create(author=self.author, group=self.group, text='Ещё')
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Ещё')
+        self.group.title = 'Переименована'
+        self.group.save()
+        self.assertContains(self.client.get(self.urls[1]), 'Переименована')
+
+    def test_authorized_users_bypass_cache(self):
+        client = Client()
+        client.force_login(self.author)
+        client.get(self.urls[0])
+        response = client.get(self.urls[0])
+        self.assertIsNotNone(response.context)
@@ -0,0 +1,86 @@
+"""Превью картинок постов, подготовленные заранее.
+
+Превью создаются после загрузки картинки фоновой задачей
+(`posts.tasks.generate_thumbnail`) и сохраняются под детерминированным
+именем рядом с оригиналом, поэтому шаблоны ссылаются на готовый файл и
+не ресайзят картинки во время запроса.
+"""
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from . import caching
+from .models import Post
+
+THUMBNAIL_SIZE = (960, 339)
+
+
+def thumbnail_name(post_id, image_name):
+    """`12`, `posts/cat.png` -> `posts/thumbs/12_cat.png_960x339.jpg`.
+
+    В имени есть id поста и полное имя оригинала с расширением, поэтому
+    превью разных постов и разных картинок никогда не совпадают.
+    """
+    directory, filename = os.path.split(image_name)
+    width, height = THUMBNAIL_SIZE
+    return os.path.join(
+        directory, 'thumbs', f'{post_id}_{filename}_{width}x{height}.jpg')
+
+
+def _owned(post_id, name):
+    """Превью создано для этого поста (а не загружено или чужое)."""
+    return os.path.basename(name).startswith(f'{post_id}_') and (
+        os.path.basename(os.path.dirname(name)) == 'thumbs')
+
+
+def _delete(post_id, name):
+    if name and _owned(post_id, name) and default_storage.exists(name):
+        default_storage.delete(name)
+
+
+def render_thumbnail(image_file):
+    """Обрезает по центру и масштабирует картинку до THUMBNAIL_SIZE."""
+    with Image.open(image_file) as image:
+        image = ImageOps.fit(
+            image.convert('RGB'), THUMBNAIL_SIZE, Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', quality=85, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def generate(post_id):
+    """Создаёт превью для картинки поста и записывает его в `thumbnail`."""
+    post = Post.objects.filter(pk=post_id).only(
+        'image', 'thumbnail', 'author_id', 'group_id').first()
+    if post is None or not post.image:
+        return None
+    name = thumbnail_name(post_id, post.image.name)
+    with post.image.open('rb') as image_file:
+        content = render_thumbnail(image_file)
+    _delete(post_id, name)
+    name = default_storage.save(name, content)
+    # update() не трогает остальные поля и не запускает сигналы поста.
+    if Post.objects.filter(pk=post_id, image=post.image.name).update(
+            thumbnail=name):
+        if post.thumbnail.name != name:
+            _delete(post_id, post.thumbnail.name)
+        caching.bump(*caching.post_scopes(post.author_id, post.group_id))
+    return name
+
+
+def schedule(post):
+    """Удаляет прежнее превью и ставит создание нового в очередь.
+
+    До готовности превью шаблоны показывают оригинал картинки.
+    """
+    from .tasks import generate_thumbnail
+
+    if post.thumbnail:
+        Post.objects.filter(pk=post.pk).update(thumbnail='')
+        _delete(post.pk, post.thumbnail.name)
+        post.thumbnail = ''
+    if post.image:
+        generate_thumbnail.delay(post.pk)
@@ -0,0 +1,235 @@
+"""Материализованная лента подписок (fan-out on write).
+
+После публикации фоновая задача `posts.tasks.publish_post` раскладывает
+пост по лентам подписчиков автора, поэтому
+чтение «Избранных авторов» — это диапазон по индексу `TimelineEntry`
+вместо join'а `Post` x `Follow` с сортировкой. Посты авторов с очень
+большим числом подписчиков не раскладываются, а подтягиваются при
+чтении (гибридная схема fan-out on read).
+
+Такие авторы отмечены строкой `PulledAuthor`. Отметка ставится, когда
+`UserCounter.followers_count` автора превышает `TIMELINE_FANOUT_LIMIT`,
+а снимается задачей `materialize` только после того, как его посты
+разложены по лентам всех подписчиков: пока отметка есть, посты читаются
+при чтении, поэтому из лент ничего не пропадает.
+
+Так же читаются и новые посты, пока задача их не разложила: запрос,
+создавший пост, вставляет только строку `PendingPost`, а задача
+удаляет её после раскладки.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+
+from core.utils import batched
+from taskqueue.queue import enqueue
+from . import caching, follows
+from .models import (
+    Follow, PendingPost, Post, PulledAuthor, TimelineEntry, UserCounter,
+)
+
+CELEBRITIES_KEY = 'timeline:celebrities:{}'
+PULLED_SCOPE = 'timeline:pulled'
+PENDING_KEY = 'timeline:pending:{}'
+PENDING_SCOPE = 'timeline:pending'
+MATERIALIZE_TASK = 'posts.tasks.materialize_timeline'
+BATCH_SIZE = 500
+
+
+def _insert(entries):
+    """Вставляет записи пачками, не собирая их все в памяти."""
+    for batch in batched(entries, BATCH_SIZE):
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def celebrities():
+    """Авторы, чьи посты подтягиваются при чтении (для чтения лент).
+
+    Ключ содержит поколение области `PULLED_SCOPE`: изменение отметок
+    делает прежний список недоступным сразу, а не по истечении TTL.
+    """
+    key = CELEBRITIES_KEY.format(caching.generation(PULLED_SCOPE))
+    authors = cache.get(key)
+    if authors is None:
+        authors = set(PulledAuthor.objects.values_list('pk', flat=True))
+        cache.set(key, authors, settings.TIMELINE_CELEBRITIES_TTL)
+    return authors
+
+
+def pending_authors():
+    """Авторы постов, ещё не разложенных по лентам (для чтения лент)."""
+    key = PENDING_KEY.format(caching.generation(PENDING_SCOPE))
+    authors = cache.get(key)
+    if authors is None:
+        authors = set(
+            PendingPost.objects.values_list('author_id', flat=True))
+        cache.set(key, authors, settings.TIMELINE_CELEBRITIES_TTL)
+    return authors
+
+
+def publish(post):
+    """Отмечает новый пост до раскладки по лентам задачей `fan_out`."""
+    PendingPost.objects.create(post=post, author_id=post.author_id)
+    caching.bump(PENDING_SCOPE)
+
+
+def is_pulled(author_id):
+    return PulledAuthor.objects.filter(pk=author_id).exists()
+
+
+def followers_changed(author_id):
+    """Переключает автора между раскладкой при записи и чтением при
+    чтении, когда число подписчиков пересекает `TIMELINE_FANOUT_LIMIT`.
+    """
+    followers = UserCounter.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+    pulled = is_pulled(author_id)
+    if followers > settings.TIMELINE_FANOUT_LIMIT and not pulled:
+        PulledAuthor.objects.bulk_create(
+            [PulledAuthor(author_id=author_id)], ignore_conflicts=True)
+        caching.bump(PULLED_SCOPE)
+    elif followers <= settings.TIMELINE_FANOUT_LIMIT and pulled:
+        enqueue(MATERIALIZE_TASK, author_id)
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора и снимает
+    отметку `PendingPost`."""
+    if not is_pulled(post.author_id):
+        followers = Follow.objects.filter(
+            author_id=post.author_id,
+            user__isnull=False,
+        ).values_list('user_id', flat=True)
+        _insert(
+            (
+                TimelineEntry(
+                    user_id=user_id,
+                    post=post,
+                    author_id=post.author_id,
+                    pub_date=post.pub_date,
+                )
+                for user_id in followers.iterator()
+            )
+        )
+    if PendingPost.objects.filter(pk=post.pk).delete()[0]:
+        caching.bump(PENDING_SCOPE)
+
+
+def backfill(user_id, author_id):
+    """Переносит последние посты автора в ленту нового подписчика."""
+    if is_pulled(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date')[:settings.TIMELINE_BACKFILL_SIZE]
+    _insert(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for post_id, pub_date in posts
+        )
+    )
+
+
+def drop(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def timeline_posts(user):
+    """Посты ленты подписок, упорядоченные по (`feed_date`, `pk`)."""
+    posts = Post.objects.select_related('author', 'group')
+    celebrity_ids, pending_ids = celebrities(), pending_authors()
+    following = (celebrity_ids or pending_ids) and follows.following_ids(user)
+    pulled = following and sorted(celebrity_ids & following)
+    pending = following and sorted(pending_ids & following)
+    if not pulled and not pending:
+        posts = posts.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'))
+    else:
+        entries = TimelineEntry.objects.filter(user=user).values('post')
+        unpublished = PendingPost.objects.filter(
+            author__in=pending).values('post')
+        posts = posts.filter(
+            Q(pk__in=entries) | Q(author__in=pulled) | Q(pk__in=unpublished)
+        ).annotate(feed_date=F('pub_date'))
+    return posts.order_by('-feed_date', '-pk')
+
+
+def _backfill_followers(author_id, followers):
+    """Раскладывает последние посты автора по лентам `followers`."""
+    posts = list(
+        Post.objects.filter(author_id=author_id).values_list(
+            'pk', 'pub_date')[:settings.TIMELINE_BACKFILL_SIZE]
+    )
+    if not posts:
+        return
+    _insert(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id in followers
+            for post_id, pub_date in posts
+        )
+    )
+
+
+def materialize(author_id):
+    """Раскладывает посты автора по лентам всех подписчиков и снимает
+    отметку `PulledAuthor`. Ничего не делает, если подписчиков снова
+    больше порога. Возвращает True, если отметка снята.
+    """
+    followers = UserCounter.objects.filter(user_id=author_id).values_list(
+        'followers_count', flat=True).first() or 0
+    if followers > settings.TIMELINE_FANOUT_LIMIT:
+        return False
+    users = Follow.objects.filter(
+        author_id=author_id, user__isnull=False,
+    ).values_list('user_id', flat=True)
+    _backfill_followers(author_id, users.iterator())
+    PulledAuthor.objects.filter(pk=author_id).delete()
+    caching.bump(PULLED_SCOPE)
+    # Посты и подписки, появившиеся во время первого прохода, не были
+    # разложены: дальше их раскладывают сигналы, а пропущенное добирает
+    # второй проход.
+    _backfill_followers(author_id, users.iterator())
+    return True
+
+
+def rebuild():
+    """Заново строит все ленты по текущим подпискам.
+
+    Нужна после массовой загрузки через `bulk_create`, которая обходит
+    сигналы. Заново отмечает авторов с числом подписчиков больше
+    `TIMELINE_FANOUT_LIMIT`. Возвращает число авторов, чьи посты
+    разложены по лентам.
+    """
+    TimelineEntry.objects.all().delete()
+    follows = Follow.objects.filter(user__isnull=False, author__isnull=False)
+    PulledAuthor.objects.all().delete()
+    PulledAuthor.objects.bulk_create(
+        PulledAuthor(author_id=author_id)
+        for author_id in follows.values('author')
+        .annotate(followers=Count('id'))
+        .filter(followers__gt=settings.TIMELINE_FANOUT_LIMIT)
+        .values_list('author', flat=True)
+    )
+    caching.bump(PULLED_SCOPE)
+    authors = list(
+        follows.exclude(author__in=PulledAuthor.objects.values('pk'))
+        .values_list('author_id', flat=True).distinct()
+    )
+    for author_id in authors:
+        _backfill_followers(
+            author_id,
+            follows.filter(author_id=author_id).values_list(
+                'user_id', flat=True),
+        )
+    return len(authors)
@@ -1,68 +1,122 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
-
+from django.utils.http import urlencode
+
+from . import thumbnails
+from .caching import (
+    cache_headers, conditional, feed_author, feed_cache, feed_group,
+    group_feed_scopes, profile_scopes,
+)
+from .counters import get_counters
+from .follows import follow, is_following, unfollow
 from .forms import PostForm, CommentForm
-from .models import Post, Group, User, Follow
+from .models import Comment, Post, User
+from .search import SearchResults
+from .timeline import timeline_posts
+
+from core.utils import CursorPaginator, pages_obj
+
 
-from core.utils import pages_obj
+def comments_page(post_id, cursor):
+    """Порция комментариев поста по keyset-курсору на `created`."""
+    return CursorPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        settings.NUM_OF_COMMENTS,
+        field='created',
+        descending=False,
+    ).get_page(cursor)
 
 
+@cache_headers
+@conditional(lambda request: ['index'], page_cache=True)
 def index(request):
     post_list = Post.objects.select_related('author', 'group')
 
     page_number = request.GET.get('page')
-    page_obj = pages_obj(post_list, page_number)
+    page_obj = pages_obj(
+        post_list, page_number, cursor=request.GET.get('cursor'))
 
     context = {
         'page_obj': page_obj,
         'index': True,
+        **feed_cache('index'),
     }
     template = "posts/index.html"
     return render(request, template, context)
 
 
+@cache_headers
+@conditional(group_feed_scopes, page_cache=True)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = feed_group(request, slug)
+    if group is None:
+        raise Http404
     post_list = group.posts.select_related('author')
 
     page_number = request.GET.get('page')
-    page_obj = pages_obj(post_list, page_number)
+    page_obj = pages_obj(
+        post_list, page_number, cursor=request.GET.get('cursor'))
 
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache(f'group:{group.pk}'),
     }
     template = 'posts/group_list.html'
     return render(request, template, context)
 
 
+@cache_headers
+@conditional(profile_scopes, page_cache=True)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
+    author = feed_author(request, username)
+    if author is None:
+        raise Http404
+    post_list = author.posts.select_related('group')
 
-    number_of_posts_by_author = post_list.count()
+    counters = get_counters(author)
     page_number = request.GET.get('page')
-    page_obj = pages_obj(post_list, page_number)
+    page_obj = pages_obj(
+        post_list, page_number, cursor=request.GET.get('cursor'))
 
-    following = request.user.is_authenticated and Follow.objects.filter(
-        user=request.user,
-        author=author).exists()
+    following = is_following(request.user, author)
     context = {
         'page_obj': page_obj,
         'author': author,
-        'number_of_posts_by_author': number_of_posts_by_author,
+        'number_of_posts_by_author': counters.posts_count,
+        'counters': counters,
         'following': following,
+        **feed_cache(f'profile:{author.pk}'),
     }
     template = "posts/profile.html"
     return render(request, template, context)
 
 
+def search(request):
+    """Полнотекстовый поиск по постам с ранжированием."""
+    query = request.GET.get('q', '').strip()
+    page_number = request.GET.get('page')
+    # Результаты упорядочены по релевантности, ключа для keyset-пагинации
+    # у них нет: страницы всегда нумерованные.
+    page_obj = Paginator(
+        SearchResults(query), settings.NUM_OF_POST).get_page(page_number)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+        'extra_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    author = post.author
-    number_of_posts_by_author = author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__counters', 'group'), pk=post_id)
+    number_of_posts_by_author = get_counters(post.author).posts_count
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = comments_page(post.pk, None)
     context = {
         'post': post,
         'comments': comments,
@@ -73,6 +127,16 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+def comments(request, post_id):
+    """Следующая порция комментариев поста HTML-фрагментом."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'comments': comments_page(post.pk, request.GET.get('cursor')),
+        'post_id': post.pk,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def post_create(request):
     """Форма создания поста."""
@@ -91,6 +155,8 @@ def post_create(request):
     post = form.save(commit=False)
     post.author = request.user
     post.save()
+    if post.image:
+        thumbnails.schedule(post)
     return redirect('posts:profile', username=post.author.username)
 
 
@@ -107,7 +173,11 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save(commit=False)
+        # Не перезаписываем счётчики, изменённые параллельными запросами.
+        post.save(update_fields=PostForm.Meta.fields)
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -131,10 +201,15 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_list = timeline_posts(request.user)
 
     page_number = request.GET.get('page')
-    page_obj = pages_obj(post_list, page_number)
+    page_obj = pages_obj(
+        post_list,
+        page_number,
+        cursor=request.GET.get('cursor'),
+        field='feed_date',
+    )
 
     context = {
         'page_obj': page_obj,
@@ -148,12 +223,12 @@ def follow_index(request):
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        follow(request.user, author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    unfollow(request.user, author)
     return redirect('posts:profile', username=username)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from taskqueue.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в пуле потоков.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=4,
+            help='Потоков в пуле; 1 — выполнять в основном потоке.')
+        parser.add_argument(
+            '--batch', type=int,
+            help='Задач за одну выборку, по умолчанию 4 на поток.')
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Пауза между проверками пустой очереди, секунды.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти.')
+
+    def handle(self, *args, **options):
+        def report(message):
+            if options['verbosity'] > 1:
+                self.stdout.write(message)
+
+        worker = Worker(
+            threads=options['threads'],
+            batch=options['batch'],
+            poll=options['poll'],
+            report=report,
+        )
+        done, failed = worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Задач выполнено: {done}, с ошибкой: {failed}.'))
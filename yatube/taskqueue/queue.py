@@ -0,0 +1,151 @@
+"""Очередь фоновых задач в базе данных.
+
+Задача — строка `Task`, вставленная в той же транзакции, что и данные
+запроса: если запрос откатился, задачи нет, если зафиксировался — она
+обязательно выполнится. Воркер (`manage.py run_tasks`) забирает задачи
+условным `UPDATE` с арендой на `TASKS_LEASE` секунд; если воркер упал,
+аренда истекает и задачу берёт другой. Поэтому доставка «хотя бы
+один раз», и задачи должны быть идемпотентными.
+
+Ошибки повторяются с экспоненциальной задержкой от `TASKS_RETRY_DELAY`,
+после `max_attempts` попыток задача остаётся в статусе `failed`.
+
+    @task
+    def generate_thumbnail(post_id):
+        ...
+
+    generate_thumbnail.delay(post.pk)
+"""
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class TaskFunction:
+    def __init__(self, func, name=None, max_attempts=None):
+        self.func = func
+        self.name = name or f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return enqueue(self.name, *args, **kwargs)
+
+
+def task(func=None, *, name=None, max_attempts=None):
+    """Регистрирует функцию как фоновую задачу.
+
+    Аргументы задачи сохраняются в JSON, поэтому передавать нужно
+    идентификаторы, а не объекты моделей.
+    """
+    def register(func):
+        wrapped = TaskFunction(func, name, max_attempts)
+        registry[wrapped.name] = wrapped
+        return wrapped
+    return register(func) if func else register
+
+
+def enqueue(name, *args, run_at=None, **kwargs):
+    """Ставит задачу в очередь.
+
+    При `TASKS_EAGER` задача выполняется сразу, если её не отложили
+    на будущее `run_at`: отложенные задачи всё равно ждут воркера.
+    """
+    function = registry[name]
+    if settings.TASKS_EAGER and (run_at is None or run_at <= timezone.now()):
+        function(*args, **kwargs)
+        return None
+    return Task.objects.create(
+        name=name,
+        payload=json.dumps({'args': args, 'kwargs': kwargs}),
+        max_attempts=function.max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def enqueue_once(name, run_at=None):
+    """Ставит задачу без аргументов, если такая же уже не ждёт к `run_at`.
+
+    Для задач, которые обрабатывают всё накопившееся сразу (отправка
+    почты, периодические пересчёты): лишние копии в очереди не нужны.
+    """
+    run_at = run_at or timezone.now()
+    waiting = Task.objects.filter(
+        name=name, status=Task.QUEUED, run_at__lte=run_at)
+    if not waiting.exists():
+        enqueue(name, run_at=run_at)
+
+
+def _due(now):
+    return (
+        Q(status=Task.QUEUED, run_at__lte=now)
+        | Q(status=Task.RUNNING, locked_until__lt=now)
+    )
+
+
+def lease(model, due, limit, **changes):
+    """Захватывает до `limit` строк `model`, подходящих под условие `due`.
+
+    Номер попытки (`attempts`) служит токеном: `UPDATE` пройдёт, только
+    если строку никто не забрал между выборкой и захватом.
+    """
+    candidates = model.objects.filter(due).values_list(
+        'pk', 'attempts')[:limit]
+    claimed = [
+        pk for pk, attempts in candidates
+        if model.objects.filter(due, pk=pk, attempts=attempts).update(
+            attempts=attempts + 1, **changes)
+    ]
+    return list(model.objects.filter(pk__in=claimed))
+
+
+def claim(limit):
+    """Забирает до `limit` готовых задач, в том числе с истёкшей арендой."""
+    now = timezone.now()
+    return lease(
+        Task, _due(now), limit,
+        status=Task.RUNNING,
+        locked_until=now + timedelta(seconds=settings.TASKS_LEASE),
+    )
+
+
+def _failed(task, error):
+    mine = Task.objects.filter(pk=task.pk, attempts=task.attempts)
+    if task.attempts >= task.max_attempts:
+        mine.update(status=Task.FAILED, locked_until=None, last_error=error)
+        logger.error('Задача %s не выполнена: %s', task, error)
+        return
+    delay = settings.TASKS_RETRY_DELAY * 2 ** (task.attempts - 1)
+    mine.update(
+        status=Task.QUEUED,
+        locked_until=None,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        last_error=error,
+    )
+
+
+def execute(task):
+    """Выполняет захваченную задачу. True, если успешно."""
+    try:
+        function = registry[task.name]
+        payload = json.loads(task.payload)
+        function(*payload['args'], **payload['kwargs'])
+    except Exception:
+        _failed(task, traceback.format_exc())
+        return False
+    # Выполненные задачи не хранятся: таблица остаётся маленькой.
+    Task.objects.filter(pk=task.pk, attempts=task.attempts).delete()
+    return True
@@ -0,0 +1,98 @@
+import json
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import queue
+from .models import Task
+from .worker import Worker
+
+calls = []
+
+
+@queue.task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@queue.task(name='tests.explode', max_attempts=2)
+def explode():
+    raise RuntimeError('сломалось')
+
+
+@override_settings(TASKS_EAGER=False, TASKS_RETRY_DELAY=30, TASKS_LEASE=300)
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def run_worker(self):
+        return Worker(threads=1).run(once=True)
+
+    def test_delay_stores_task(self):
+        task = record.delay('a')
+        self.assertEqual(task.name, 'tests.record')
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertEqual(
+            json.loads(task.payload), {'args': ['a'], 'kwargs': {}})
+        self.assertEqual(calls, [])
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_runs_immediately(self):
+        self.assertIsNone(record.delay('a'))
+        self.assertEqual(calls, ['a'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_worker_executes_and_deletes(self):
+        record.delay('a')
+        record.delay(value='b')
+        self.assertEqual(self.run_worker(), (2, 0))
+        self.assertEqual(calls, ['a', 'b'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_future_task_waits(self):
+        queue.enqueue(
+            'tests.record', 'a', run_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(self.run_worker(), (0, 0))
+        self.assertEqual(calls, [])
+
+    def test_failure_retries_with_backoff_then_fails(self):
+        task = explode.delay()
+        before = timezone.now()
+        self.assertEqual(self.run_worker(), (0, 1))
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertEqual(task.attempts, 1)
+        self.assertIn('сломалось', task.last_error)
+        self.assertGreaterEqual(task.run_at, before + timedelta(seconds=30))
+
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        with self.assertLogs('taskqueue.queue', 'ERROR'):
+            self.run_worker()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, 2)
+        self.assertEqual(self.run_worker(), (0, 0))
+
+    def test_expired_lease_is_reclaimed(self):
+        record.delay('a')
+        [task] = queue.claim(10)
+        self.assertEqual(queue.claim(10), [])
+        Task.objects.filter(pk=task.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+        [again] = queue.claim(10)
+        self.assertEqual(again.attempts, 2)
+        # Первый воркер опоздал: его результат не удаляет чужую попытку.
+        queue.execute(task)
+        self.assertTrue(Task.objects.filter(pk=task.pk).exists())
+        self.assertTrue(queue.execute(again))
+        self.assertFalse(Task.objects.exists())
+
+    def test_run_tasks_command(self):
+        record.delay('a')
+        out = StringIO()
+        call_command('run_tasks', '--once', '--threads=1', stdout=out)
+        self.assertEqual(calls, ['a'])
+        self.assertIn('Задач выполнено: 1', out.getvalue())
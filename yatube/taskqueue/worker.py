@@ -0,0 +1,61 @@
+"""Воркер очереди: забирает пачки задач и выполняет их в пуле потоков."""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from . import queue
+
+logger = logging.getLogger(__name__)
+
+
+def _execute(task):
+    try:
+        return queue.execute(task)
+    finally:
+        # У каждого потока своё соединение: закрываем устаревшие.
+        close_old_connections()
+
+
+class Worker:
+    def __init__(self, threads=4, batch=None, poll=1.0, report=None):
+        self.threads = threads
+        self.batch = batch or threads * 4
+        self.poll = poll
+        self.report = report or (lambda message: None)
+        self.executor = (
+            ThreadPoolExecutor(threads, thread_name_prefix='tasks')
+            if threads > 1 else None
+        )
+
+    def run_batch(self):
+        """Выполняет одну пачку; возвращает (успешно, с ошибкой)."""
+        tasks = queue.claim(self.batch)
+        if self.executor is None:
+            results = [queue.execute(task) for task in tasks]
+        else:
+            results = list(self.executor.map(_execute, tasks))
+        done = sum(results)
+        return done, len(results) - done
+
+    def run(self, once=False):
+        """Работает, пока не прервут; с `once` — пока есть готовые задачи."""
+        total_done = total_failed = 0
+        try:
+            while True:
+                done, failed = self.run_batch()
+                total_done += done
+                total_failed += failed
+                if done or failed:
+                    self.report(f'Выполнено: {done}, с ошибкой: {failed}')
+                    continue
+                if once:
+                    break
+                time.sleep(self.poll)
+        except KeyboardInterrupt:
+            logger.info('Воркер остановлен')
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+        return total_done, total_failed
@@ -0,0 +1,64 @@
+"""Выбор общего бэкенда кеша из переменных окружения.
+
+LocMemCache у каждого процесса свой, поэтому в продакшене фрагменты и
+страницы кешируются в memcached или Redis, общем для всех воркеров.
+
+Переменные окружения:
+    CACHE_BACKEND     locmem (по умолчанию), file, db, memcached (нужен
+                      pylibmc), redis (нужен django-redis);
+    CACHE_LOCATION    адрес сервера(ов) через запятую, каталог или таблица;
+    CACHE_KEY_PREFIX  префикс ключей, разделяет развёртывания;
+    CACHE_VERSION     версия ключей, меняется при несовместимом релизе;
+    CACHE_POOL_SIZE   максимум соединений в пуле процесса (redis).
+"""
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'memcached': 'django.core.cache.backends.memcached.PyLibMCCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+
+DEFAULT_LOCATIONS = {
+    'locmem': 'yatube',
+    'db': 'cache_table',
+    'memcached': '127.0.0.1:11211',
+    'redis': 'redis://127.0.0.1:6379/1',
+}
+
+
+def build_caches(env=os.environ, base_dir=''):
+    """Возвращает значение для `settings.CACHES`."""
+    backend = env.get('CACHE_BACKEND', 'locmem')
+    if backend not in CACHE_BACKENDS:
+        raise ImproperlyConfigured(
+            f'Неизвестный CACHE_BACKEND {backend!r}, '
+            f'доступны: {", ".join(CACHE_BACKENDS)}'
+        )
+    location = env.get('CACHE_LOCATION') or DEFAULT_LOCATIONS.get(
+        backend, os.path.join(base_dir, 'cache'))
+    pool_size = int(env.get('CACHE_POOL_SIZE', 10))
+    config = {
+        'BACKEND': CACHE_BACKENDS[backend],
+        'LOCATION': location,
+        'KEY_PREFIX': env.get('CACHE_KEY_PREFIX', 'yatube'),
+        'VERSION': int(env.get('CACHE_VERSION', 1)),
+    }
+    if backend == 'memcached':
+        # Клиент pylibmc создаётся один на поток и держит соединения
+        # открытыми; ketama распределяет ключи между серверами.
+        config['LOCATION'] = location.split(',')
+        config['OPTIONS'] = {
+            'binary': True,
+            'behaviors': {'tcp_nodelay': True, 'ketama': True},
+        }
+    elif backend == 'redis':
+        config['OPTIONS'] = {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'CONNECTION_POOL_KWARGS': {'max_connections': pool_size},
+        }
+    return {'default': config}
@@ -0,0 +1,33 @@
+"""Настройки баз данных из переменных окружения.
+
+Переменные окружения:
+    DATABASE_REPLICAS     пути к файлам реплик SQLite через запятую;
+                          реплики получают алиасы replica1, replica2, ...
+    DATABASE_CONN_MAX_AGE сколько секунд держать соединение открытым
+                          между запросами (0 — закрывать после каждого,
+                          по умолчанию 60).
+"""
+import os
+
+
+def build_databases(env=os.environ, base_dir=''):
+    """Возвращает значение для `settings.DATABASES`."""
+    conn_max_age = int(env.get('DATABASE_CONN_MAX_AGE', 60))
+    databases = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(base_dir, 'db.sqlite3'),
+            'CONN_MAX_AGE': conn_max_age,
+        }
+    }
+    replicas = [path for path in env.get(
+        'DATABASE_REPLICAS', '').split(',') if path]
+    for index, path in enumerate(replicas, 1):
+        databases[f'replica{index}'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': path,
+            'CONN_MAX_AGE': conn_max_age,
+            # В тестах реплика — то же соединение, что и основная база.
+            'TEST': {'MIRROR': 'default'},
+        }
+    return databases
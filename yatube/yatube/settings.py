@@ -14,6 +14,9 @@ import os
 
 from dotenv import load_dotenv
 
+from .caches import build_caches
+from .databases import build_databases
+
 load_dotenv()
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -52,10 +55,16 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
+    'taskqueue.apps.TaskQueueConfig',
+    'mailer.apps.MailerConfig',
+    'notifications.apps.NotificationsConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +90,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.year.year',
+                'notifications.context_processors.unread',
             ],
         },
     },
@@ -92,12 +102,17 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
-}
+DATABASES = build_databases(os.environ, BASE_DIR)
+
+# Чтения безопасных запросов уходят на реплики (core.routers).
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Сколько секунд после записи клиент читает только с основной базы.
+REPLICA_STICKY_SECONDS = 10
+# Проверять постоянные соединения перед запросом (core.connections).
+DATABASE_CONN_HEALTH_CHECKS = True
+# Сколько постоянных соединений процесс держит между запросами.
+DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 8))
 
 
 # Password validation
@@ -146,17 +161,106 @@ LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
 
-#  подключаем движок filebased.EmailBackend
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Письма ставятся в очередь (mailer.spool) и уходят фоновой задачей
+# пачками через одно соединение MAIL_DELIVERY_BACKEND. По умолчанию
+# письма пишутся в файлы, для SMTP:
+# MAIL_DELIVERY_BACKEND=django.core.mail.backends.smtp.EmailBackend.
+EMAIL_BACKEND = 'mailer.backends.SpoolBackend'
+MAIL_DELIVERY_BACKEND = os.getenv(
+    'MAIL_DELIVERY_BACKEND',
+    'django.core.mail.backends.filebased.EmailBackend',
+)
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', '') == '1'
+EMAIL_TIMEOUT = 10
+# Писем за одно соединение с почтовым сервером.
+MAIL_BATCH_SIZE = 100
+MAIL_MAX_ATTEMPTS = 5
+# Задержка перед первым повтором письма, секунды; дальше удваивается.
+MAIL_RETRY_DELAY = 60
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
-}
+# Бэкенд кеша выбирается переменными окружения CACHE_* (см. caches.py):
+# в продакшене общий memcached/Redis, в разработке и тестах LocMemCache.
+CACHES = build_caches(os.environ, BASE_DIR)
 
 NUM_OF_POST = 10
+
+# Keyset-пагинация лент по (pub_date, id) вместо COUNT(*) + OFFSET.
+# Независимо от настройки включается параметром ?cursor= в запросе.
+CURSOR_PAGINATION = False
+
+# Лента подписок: посты авторов, у которых подписчиков больше порога,
+# не раскладываются по лентам при записи, а подтягиваются при чтении.
+TIMELINE_FANOUT_LIMIT = 10000
+# Сколько последних постов автора попадает в ленту при подписке.
+TIMELINE_BACKFILL_SIZE = 200
+# Как долго кешируется список авторов, чьи посты подтягиваются при
+# чтении, секунды (при изменении списка кеш сбрасывается сразу).
+TIMELINE_CELEBRITIES_TTL = 300
+
+# Время жизни фрагментов лент в кеше. Свежесть обеспечивают версии
+# ключей (posts.caching), поэтому TTL может быть долгим.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+# Сколько секунд обратный прокси может хранить анонимные ленты.
+FEED_HTTP_MAX_AGE = 60
+# Сколько секунд хранить в кеше готовые страницы лент для анонимов.
+# Устаревшие страницы не читаются и раньше: ключ зависит от версии ленты.
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Комментариев в одной порции на странице поста.
+NUM_OF_COMMENTS = 20
+
+
+# Бэкенд полнотекстового поиска (posts.search). Для баз без FTS5:
+# 'posts.search.LikeSearchBackend'.
+SEARCH_BACKEND = 'posts.search.SQLiteFTSBackend'
+
+# Токен для /metrics: Prometheus передаёт его заголовком
+# `Authorization: Bearer <токен>`. Без токена метрики видны только
+# сотрудникам (is_staff) — за обратным прокси адрес клиента всегда
+# 127.0.0.1 и для проверки не годится.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# PRAGMA для каждого нового соединения SQLite (core.sqlite).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Отрицательное значение — размер кеша страниц в КиБ.
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024)),
+    'temp_store': 'memory',
+}
+
+# Наибольший размер страницы JSON API (`?limit=`).
+API_MAX_PAGE_SIZE = 100
+# Сколько имён можно передать в одном запросе массовой подписки.
+API_BULK_FOLLOW_LIMIT = 100
+
+# Фоновые задачи (taskqueue): выполняет `manage.py run_tasks`.
+# TASKS_EAGER=1 выполняет задачи сразу в запросе, без воркера.
+TASKS_EAGER = os.getenv('TASKS_EAGER', '') == '1'
+TASKS_MAX_ATTEMPTS = 5
+# Задержка перед первым повтором, секунды; дальше удваивается.
+TASKS_RETRY_DELAY = 30
+# Сколько секунд задача принадлежит воркеру, прежде чем её заберёт другой.
+TASKS_LEASE = 300
+
+# Уведомления о новых постах (notifications). Посты автора, вышедшие за
+# это число секунд, пока уведомление не прочитано, собираются в дайджест.
+NOTIFICATIONS_DIGEST_WINDOW = 60 * 60
+# Строк в одном INSERT при рассылке уведомлений подписчикам.
+NOTIFICATIONS_BATCH_SIZE = 1000
+NOTIFICATIONS_PAGE_SIZE = 50
+
+# Рекомендации подписок (posts.suggestions): сколько хранить на
+# пользователя и как часто пересчитывать, секунды.
+SUGGESTIONS_PER_USER = 20
+SUGGESTIONS_REFRESH_INTERVAL = 60 * 60 * 6